@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+"""Registry of the accounts used by turpial-cmd"""
+
+import threading
+
+class AccountRegistry(object):
+    """Keep the list of registered accounts and their parsed username and
+    protocol, so Core is asked for them only after the list changes.
+    Call invalidate() each time an account is added, edited or deleted
+    """
+
+    def __init__(self, core):
+        self.core = core
+        self.lock = threading.Lock()
+        self.accounts = None
+        self.parsed = {}
+
+    def __parse(self, acc):
+        if acc not in self.parsed:
+            self.parsed[acc] = tuple(acc.rsplit('-', 1))
+        return self.parsed[acc]
+
+    def list(self):
+        self.lock.acquire()
+        try:
+            if self.accounts is None:
+                self.accounts = list(self.core.list_accounts())
+                self.parsed = {}
+            return list(self.accounts)
+        finally:
+            self.lock.release()
+
+    def username(self, acc):
+        return self.__parse(acc)[0]
+
+    def protocol(self, acc):
+        return self.__parse(acc)[1]
+
+    def name(self, acc):
+        """Returns the account in the 'username - protocol' form"""
+        return '%s - %s' % self.__parse(acc)
+
+    def invalidate(self):
+        self.lock.acquire()
+        try:
+            self.accounts = None
+        finally:
+            self.lock.release()
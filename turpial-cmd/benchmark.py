@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark of turpial-cmd against a fake Core backend
+
+Usage: python benchmark.py [options]
+
+The shell runs scripted sessions (login, column fetch and render, column
+merged from all the accounts, broadcast update, search and trends) over a local fake Core with configurable latency,
+payload size, error rate and number of accounts, and reports throughput,
+p50/p99 latency and peak memory for each one. The startup time of the paths
+that must not load Core is measured against STARTUP_TARGET, and the HTTP
+connection pool against a new connection per request on a local stand-in
+server. The exit status is 1 when a scenario fails (or has errors without
+--error-rate) or a startup path fails or misses the target
+"""
+
+import os
+import imp
+import sys
+import time
+import pickle
+import random
+import shutil
+import urllib2
+import tempfile
+import threading
+import subprocess
+from optparse import OptionParser
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from shell import Turpial
+from pool import ConnectionPool
+from keepalive import build_opener
+
+SHELL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    'turpial-cmd.py')
+
+# Max time (in seconds) for the paths that must not load Core
+STARTUP_TARGET = 0.1
+STARTUP_COMMANDS = [
+    ('--version', ['--version']),
+    ('-m help', ['-m', 'help']),
+]
+
+class FakeResponse(object):
+    def __init__(self, items=None, code=0, errmsg=''):
+        self.items = items
+        self.code = code
+        self.errmsg = errmsg
+
+    def __iter__(self):
+        if isinstance(self.items, list):
+            return iter(self.items)
+        return iter([])
+
+    def __len__(self):
+        if isinstance(self.items, list):
+            return len(self.items)
+        return 0
+
+class FakeAuth(object):
+    url = 'http://localhost/oauth'
+
+    def must_auth(self):
+        return False
+
+class FakeStatus(object):
+    def __init__(self, id_, account, size):
+        self.id_ = str(id_)
+        self.account_id = account
+        self.username = 'user%i' % (id_ % 50)
+        self.text = ('status %i ' % id_ + 'lorem ipsum dolor sit amet ' * 6)[:size]
+        self.source = 'benchmark'
+        self.timestamp = time.time()
+        self.datetime = time.strftime('%b %d, %H:%M', time.localtime(self.timestamp))
+        self.in_reply_to_id = None
+        self.in_reply_to_user = None
+        self.reposted_by = None
+
+class FakeTopic(object):
+    def __init__(self, name):
+        self.name = name
+        self.promoted = False
+
+class FakeTrend(object):
+    def __init__(self, title, topics):
+        self.title = title
+        self.items = [FakeTopic('#topic%i' % i) for i in range(topics)]
+
+class FakeCore(object):
+    """Implement the part of libturpial Core used by the shell. Every network
+    call sleeps 'latency' seconds (+/- 20%) and fails with 'error_rate'
+    probability. Column and search calls return 'payload' statuses"""
+
+    def __init__(self, latency=0.05, payload=20, error_rate=0, accounts=3,
+            text_size=140):
+        self.latency = latency
+        self.payload = payload
+        self.error_rate = error_rate
+        self.text_size = text_size
+        self.accounts = ['bench%i-twitter' % i for i in range(accounts)]
+        self.logged = set()
+        self.last_id = 0
+
+    def __network(self):
+        time.sleep(self.latency * random.uniform(0.8, 1.2))
+        return random.random() >= self.error_rate
+
+    def __error(self):
+        return FakeResponse(code=1, errmsg='Fake error')
+
+    def __statuses(self, account, count, since_id=None):
+        if not self.__network():
+            return self.__error()
+        self.last_id += count
+        first = self.last_id - count + 1
+        if since_id:
+            first = max(first, int(since_id) + 1)
+        return FakeResponse([FakeStatus(i, account, self.text_size)
+            for i in range(self.last_id, first - 1, -1)])
+
+    def list_accounts(self):
+        return list(self.accounts)
+
+    def list_protocols(self):
+        return ['twitter', 'identica']
+
+    def list_columns(self, account):
+        return ['timeline', 'replies', 'directs', 'favorites']
+
+    def has_stored_passwd(self, account):
+        return True
+
+    def register_account(self, username, protocol, password, remember=False):
+        return '%s-%s' % (username, protocol)
+
+    def unregister_account(self, account, delete_all=False):
+        pass
+
+    def is_account_logged_in(self, account):
+        return account in self.logged
+
+    def login(self, account):
+        if not self.__network():
+            return self.__error()
+        return FakeResponse(FakeAuth())
+
+    def authorize_oauth_token(self, account, pin):
+        pass
+
+    def auth(self, account):
+        if not self.__network():
+            return self.__error()
+        self.logged.add(account)
+        return FakeResponse(True)
+
+    def get_column_statuses(self, account, column, count=None, since_id=None):
+        return self.__statuses(account, self.payload, since_id)
+
+    def get_public_timeline(self, account):
+        return self.__statuses(account, self.payload)
+
+    def search(self, account, query, count=None, since_id=None):
+        return self.__statuses(account, self.payload, since_id)
+
+    def get_conversation(self, account, status_id):
+        return self.__statuses(account, 5)
+
+    def update_status(self, account, text, in_reply_id=None):
+        if not self.__network():
+            return self.__error()
+        self.last_id += 1
+        return FakeResponse(FakeStatus(self.last_id, account, self.text_size))
+
+    def trends(self, account):
+        if not self.__network():
+            return self.__error()
+        return FakeResponse([FakeTrend('Worldwide', 10),
+            FakeTrend('Local', 10)])
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send the response in one write, small writes wait for delayed ACKs
+    wbufsize = -1
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        body = '[]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """Local HTTP/1.1 server that answers every request after 'latency'
+    seconds. Each new connection costs 'handshake' seconds more, like the
+    TCP and TLS handshakes with a real server"""
+    daemon_threads = True
+
+    def __init__(self, latency, handshake):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.latency = latency
+        self.handshake = handshake
+        self.connections = 0
+
+    def get_request(self):
+        request = HTTPServer.get_request(self)
+        self.connections += 1
+        time.sleep(self.handshake)
+        return request
+
+class NullOutput(object):
+    """Discard the output of the shell while keeping the cost of writing it"""
+
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+SCENARIOS = [
+    ('login', 'login --all'),
+    ('column', 'column timeline'),
+    ('merged', 'column all timeline'),
+    ('broadcast', 'status update --all --text "Benchmark status"'),
+    ('search', 'search --query benchmark'),
+    ('trends', 'trends'),
+]
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0
+    index = int(round((len(values) - 1) * percent / 100.0))
+    return values[index]
+
+def load_shell():
+    return imp.load_source('turpial_cmd', SHELL_PATH)
+
+def run_scenario(shell, core, command, iterations):
+    timings = []
+    failed = 0
+    start = time.time()
+    for i in range(iterations):
+        # Login must start from scratch on each iteration
+        if command.startswith('login'):
+            core.logged.clear()
+        elif command.startswith('column all'):
+            core.logged.update(core.accounts)
+        begin = time.time()
+        if shell.onecmd(command) is False:
+            failed += 1
+        timings.append(time.time() - begin)
+    elapsed = time.time() - start
+    return timings, failed, elapsed
+
+def peak_memory(usage):
+    """Returns the ru_maxrss of a resource usage in MB"""
+    # ru_maxrss is given in kilobytes on Linux and bytes on Mac OS
+    peak = usage.ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return peak / 1024.0
+
+def run_isolated(shell, core, command, iterations):
+    """Run the scenario in a child process, so each one has its own peak
+    memory. Returns the results of run_scenario and the peak in MB"""
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        code = 0
+        fd = os.fdopen(write, 'wb')
+        try:
+            try:
+                pickle.dump(run_scenario(shell, core, command, iterations),
+                    fd)
+                shell.close()
+            except Exception, exc:
+                sys.stderr.write('%s: %s\n' % (command, exc))
+                code = 1
+        finally:
+            fd.close()
+            # Skip the cleanup of the parent
+            os._exit(code)
+    os.close(write)
+    fd = os.fdopen(read, 'rb')
+    try:
+        data = fd.read()
+    finally:
+        fd.close()
+    usage = os.wait4(pid, 0)[2]
+    if not data:
+        raise RuntimeError('Scenario %s failed' % command)
+    return pickle.loads(data) + (peak_memory(usage), )
+
+def run_startup(iterations):
+    """Returns the startup timings of the shell processes and the error of
+    the last one that failed, if any"""
+    results = []
+    devnull = open(os.devnull, 'w')
+    for name, args in STARTUP_COMMANDS:
+        timings = []
+        error = None
+        for i in range(iterations):
+            begin = time.time()
+            proc = subprocess.Popen([sys.executable, SHELL_PATH] + args,
+                stdout=devnull, stderr=subprocess.PIPE)
+            stderr = proc.communicate()[1]
+            timings.append(time.time() - begin)
+            if proc.returncode != 0:
+                lines = stderr.strip().splitlines() or ['']
+                error = 'exit code %i: %s' % (proc.returncode, lines[-1])
+        results.append((name, timings, error))
+    devnull.close()
+    return results
+
+def run_http(options):
+    """Returns the timings and connections opened requesting a stand-in
+    server with a new connection per request and with the pool"""
+    # A TLS handshake takes about two round trips
+    server = StandInServer(options.latency, options.latency * 2)
+    th = threading.Thread(target=server.serve_forever)
+    th.setDaemon(True)
+    th.start()
+    url = 'http://127.0.0.1:%i/statuses.json' % server.server_address[1]
+    accounts = ['bench%i-twitter' % i for i in range(options.accounts)]
+
+    pool = ConnectionPool()
+    results = []
+    for name, opener in [('new conn', urllib2.build_opener()),
+            ('pooled', build_opener(pool))]:
+        timings = []
+        connections = server.connections
+        start = time.time()
+        for i in range(options.iterations * len(accounts)):
+            pool.set_account(accounts[i % len(accounts)])
+            begin = time.time()
+            opener.open(url).read()
+            timings.append(time.time() - begin)
+        results.append((name, timings, time.time() - start,
+            server.connections - connections))
+    pool.close()
+    server.shutdown()
+    return results
+
+def run(options):
+    module = load_shell()
+    core = FakeCore(options.latency, options.payload, options.error_rate,
+        options.accounts)
+    datadir = tempfile.mkdtemp(prefix='turpial-cmd-bench')
+    # The fake backend has no rate limits
+    shell_options = module.get_options(['--data-dir', datadir, '-w',
+        str(options.workers), '-r', '0', '--rate-limit', '1000000'])
+
+    results = []
+    broken = []
+    stdout = sys.stdout
+    sys.stdout = NullOutput()
+    try:
+        shell = Turpial(shell_options, core)
+        shell.interactive = False
+        shell.account = core.list_accounts()[0]
+        for name, command in SCENARIOS:
+            if options.scenarios and name not in options.scenarios:
+                continue
+            try:
+                timings, failed, elapsed, peak = run_isolated(shell, core,
+                    command, options.iterations)
+            except RuntimeError, exc:
+                broken.append((name, str(exc)))
+                continue
+            results.append((name, timings, failed, elapsed, peak))
+        shell.close()
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(datadir, True)
+
+    print "Latency %.0fms, payload %i statuses, error rate %.0f%%, %i accounts" % (
+        options.latency * 1000, options.payload, options.error_rate * 100,
+        options.accounts)
+    print "%-10s %8s %8s %10s %10s %10s" % ('scenario', 'ops/s', 'errors',
+        'p50 (ms)', 'p99 (ms)', 'peak (MB)')
+    for name, timings, failed, elapsed, peak in results:
+        print "%-10s %8.1f %8i %10.1f %10.1f %10.1f" % (name,
+            len(timings) / elapsed, failed, percentile(timings, 50) * 1000,
+            percentile(timings, 99) * 1000, peak)
+    for name, error in broken:
+        print "%-10s FAILED (%s)" % (name, error)
+    # Without fake errors every command must succeed
+    failures = len(broken) + len([result for result in results
+        if result[2] and not options.error_rate])
+    if not options.scenarios or 'startup' in options.scenarios:
+        print "\nStartup (target %.0f ms):" % (STARTUP_TARGET * 1000)
+        for name, timings, error in run_startup(options.iterations):
+            p50 = percentile(timings, 50)
+            result = 'OK'
+            if error:
+                result = 'FAILED (%s)' % error
+            elif p50 > STARTUP_TARGET:
+                result = 'SLOW'
+            if result != 'OK':
+                failures += 1
+            print "%-10s %10.1f %10.1f  %s" % (name, p50 * 1000,
+                percentile(timings, 99) * 1000, result)
+    if not options.scenarios or 'http' in options.scenarios:
+        print "\nHTTP requests (handshake %.0f ms):" % (options.latency * 2000)
+        print "%-10s %8s %10s %10s %12s" % ('mode', 'ops/s', 'p50 (ms)',
+            'p99 (ms)', 'connections')
+        for name, timings, elapsed, connections in run_http(options):
+            print "%-10s %8.1f %10.1f %10.1f %12i" % (name,
+                len(timings) / elapsed, percentile(timings, 50) * 1000,
+                percentile(timings, 99) * 1000, connections)
+    if failures:
+        sys.stderr.write('%i checks failed\n' % failures)
+    return failures
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option('-l', '--latency', dest='latency', type='float',
+        help='seconds of latency of each fake request (default 0.05)',
+        default=0.05)
+    parser.add_option('-p', '--payload', dest='payload', type='int',
+        help='statuses returned by each fake request (default 20)', default=20)
+    parser.add_option('-e', '--error-rate', dest='error_rate', type='float',
+        help='probability of a fake request to fail (default 0)', default=0)
+    parser.add_option('-a', '--accounts', dest='accounts', type='int',
+        help='number of fake accounts (default 3)', default=3)
+    parser.add_option('-n', '--iterations', dest='iterations', type='int',
+        help='times each scenario is executed (default 20)', default=20)
+    parser.add_option('-w', '--workers', dest='workers', type='int',
+        help='workers of the shell for multi-account commands (default 4)',
+        default=4)
+    parser.add_option('-s', '--scenario', dest='scenarios', action='append',
+        help='run only this scenario (can be repeated)', default=[])
+    (options, args) = parser.parse_args()
+    if run(options):
+        sys.exit(1)
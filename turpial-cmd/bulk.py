@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""Checkpoint and report files of the bulk friend operations of turpial-cmd"""
+
+import os
+import threading
+
+REPORT_FIELDS = ['username', 'result', 'error', 'attempts', 'seconds']
+
+def read_usernames(fd):
+    """Returns the usernames of fd (one per line) without duplicates, blank
+    lines and comments"""
+    usernames = []
+    seen = set()
+    for line in fd:
+        username = line.split('#', 1)[0].strip().lstrip('@')
+        if username and username.lower() not in seen:
+            seen.add(username.lower())
+            usernames.append(username)
+    return usernames
+
+def encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+class Checkpoint(object):
+    """Append-only file with the usernames already processed by a bulk
+    operation, so an interrupted run can be resumed skipping them"""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.done = set()
+
+        basedir = os.path.dirname(filepath)
+        if basedir and not os.path.isdir(basedir):
+            os.makedirs(basedir)
+        if os.path.isfile(filepath):
+            fd = open(filepath, 'r')
+            try:
+                self.done = set([line.strip() for line in fd if line.strip()])
+            finally:
+                fd.close()
+        self.fd = open(filepath, 'a')
+
+    def __contains__(self, username):
+        return username in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def add(self, username):
+        self.lock.acquire()
+        try:
+            self.done.add(username)
+            self.fd.write(username + '\n')
+            self.fd.flush()
+        finally:
+            self.lock.release()
+
+    def close(self, remove=False):
+        self.fd.close()
+        if remove:
+            os.remove(self.filepath)
+
+class Report(object):
+    """CSV file with the result of each username of a bulk operation"""
+
+    def __init__(self, filepath):
+        import csv
+        self.filepath = filepath
+        self.lock = threading.Lock()
+
+        basedir = os.path.dirname(filepath)
+        if basedir and not os.path.isdir(basedir):
+            os.makedirs(basedir)
+        self.fd = open(filepath, 'wb')
+        self.writer = csv.writer(self.fd)
+        self.writer.writerow(REPORT_FIELDS)
+
+    def add(self, username, result, error, attempts, seconds):
+        self.lock.acquire()
+        try:
+            row = [username, result, error or '', attempts, '%.3f' % seconds]
+            self.writer.writerow([encode(value) for value in row])
+            self.fd.flush()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.fd.close()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""Persistent cache of column statuses for turpial-cmd"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from common import DEFAULT_CACHE_SIZE, DEFAULT_CACHE_AGE
+
+FIELDS = ['id_', 'username', 'text', 'source', 'datetime', 'timestamp',
+    'in_reply_to_id', 'in_reply_to_user', 'reposted_by']
+
+# Timestamps have a resolution of one second, statuses of the same second
+# are sorted by id (numeric ids by value, as they are stored as text)
+NEWEST_FIRST = 'timestamp DESC, length(id_) DESC, id_ DESC'
+
+def id_key(id_):
+    """Sort key of status ids, numeric when possible"""
+    id_ = str(id_)
+    if id_.isdigit():
+        return (0, int(id_))
+    return (1, id_)
+
+class CachedStatus(object):
+    """Status restored from the cache. It has the same attributes of the
+    libturpial statuses used by the shell"""
+
+    def __init__(self, row):
+        for i in range(len(FIELDS)):
+            setattr(self, FIELDS[i], row[i])
+        if self.reposted_by:
+            self.reposted_by = self.reposted_by.split(' ')
+        self.account_id = row[len(FIELDS)]
+
+class StatusCache(object):
+    """Store the statuses of each column per account in a SQLite database.
+
+    Only the newest 'size' statuses of each column are kept and statuses
+    older than 'age' days are discarded
+    """
+
+    def __init__(self, filepath, size=DEFAULT_CACHE_SIZE, age=DEFAULT_CACHE_AGE):
+        self.filepath = filepath
+        self.size = size
+        self.age = age * 86400
+        self.lock = threading.Lock()
+
+        basedir = os.path.dirname(filepath)
+        if not os.path.isdir(basedir):
+            os.makedirs(basedir)
+
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS statuses (
+            account TEXT, column_id TEXT, id_ TEXT, username TEXT, text TEXT,
+            source TEXT, datetime TEXT, timestamp REAL, in_reply_to_id TEXT,
+            in_reply_to_user TEXT, reposted_by TEXT,
+            PRIMARY KEY (account, column_id, id_))''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS statuses_time
+            ON statuses (account, column_id, timestamp)''')
+        self.conn.commit()
+
+    def __row(self, account, column, status):
+        reposted_by = status.reposted_by
+        if isinstance(reposted_by, (list, tuple)):
+            reposted_by = ' '.join(reposted_by)
+        timestamp = getattr(status, 'timestamp', None) or time.time()
+        return (account, column, str(status.id_), status.username, status.text,
+            status.source, status.datetime, timestamp, status.in_reply_to_id,
+            status.in_reply_to_user, reposted_by or None)
+
+    def __evict(self, account, column):
+        self.conn.execute('''DELETE FROM statuses WHERE account = ? AND
+            column_id = ? AND timestamp < ?''', (account, column,
+            time.time() - self.age))
+        self.conn.execute('''DELETE FROM statuses WHERE account = ? AND
+            column_id = ? AND id_ NOT IN (SELECT id_ FROM statuses WHERE
+            account = ? AND column_id = ? ORDER BY %s LIMIT ?)''' % 
+            NEWEST_FIRST, (account, column, account, column, self.size))
+
+    def last_id(self, account, column):
+        """Returns the id of the newest cached status of the column or None"""
+        self.lock.acquire()
+        try:
+            row = self.conn.execute('''SELECT id_ FROM statuses WHERE
+                account = ? AND column_id = ? ORDER BY %s LIMIT 1''' % 
+                NEWEST_FIRST, (account, column)).fetchone()
+        finally:
+            self.lock.release()
+        if row:
+            return row[0]
+        return None
+
+    def store(self, account, column, statuses):
+        """Merge statuses into the cached column. Returns the number of
+        statuses that weren't cached before"""
+        rows = [self.__row(account, column, status) for status in statuses]
+        self.lock.acquire()
+        try:
+            before = self.conn.total_changes
+            self.conn.executemany('''INSERT OR IGNORE INTO statuses VALUES
+                (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+            added = self.conn.total_changes - before
+            self.__evict(account, column)
+            self.conn.commit()
+        finally:
+            self.lock.release()
+        return added
+
+    def get(self, account, column, count=None):
+        """Returns the newest cached statuses of the column"""
+        query = 'SELECT %s, account FROM statuses WHERE account = ? AND \
+            column_id = ? ORDER BY %s' % (', '.join(FIELDS), NEWEST_FIRST)
+        args = (account, column)
+        if count:
+            query += ' LIMIT ?'
+            args += (count, )
+        self.lock.acquire()
+        try:
+            rows = self.conn.execute(query, args).fetchall()
+        finally:
+            self.lock.release()
+        return [CachedStatus(row) for row in rows]
+
+    def clear(self, account, column=None):
+        self.lock.acquire()
+        try:
+            if column:
+                self.conn.execute('''DELETE FROM statuses WHERE account = ?
+                    AND column_id = ?''', (account, column))
+            else:
+                self.conn.execute('DELETE FROM statuses WHERE account = ?',
+                    (account, ))
+            self.conn.commit()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.conn.close()
+        finally:
+            self.lock.release()
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Defaults of the options of turpial-cmd and helpers needed before the
+shell is loaded. Keep it free of imports: --help, --version and --clean
+only load this module, optparse and config"""
+
+import sys
+
+# Multi-account commands
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 2
+
+# Local data
+DEFAULT_CACHE_SIZE = 200
+DEFAULT_CACHE_AGE = 7
+DEFAULT_GRAPH_TTL = 3600
+DEFAULT_PROFILE_CACHE_SIZE = 500
+DEFAULT_PROFILE_TTL = 900
+DEFAULT_STATUS_CACHE_SIZE = 5000
+DEFAULT_TRENDS_TTL = 300
+DEFAULT_DIRECTS_TTL = 60
+
+# Output and pagination
+DEFAULT_PAGE_SIZE = 20
+DEFAULT_PREFETCH = 2
+
+# Rate limits
+DEFAULT_LIMIT = 150
+DEFAULT_WINDOW = 3600
+DEFAULT_MAX_WAIT = 30
+
+# HTTP connections
+DEFAULT_POOL_SIZE = 4
+DEFAULT_IDLE_TIMEOUT = 60
+
+# Socket of --serve and --connect in the data directory
+SOCKET_NAME = 'turpial-cmd.sock'
+
+def lazy_import(name):
+    """Import a module on demand"""
+    __import__(name)
+    return sys.modules[name]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""In-memory indexes for the tab completion of turpial-cmd"""
+
+import bisect
+import threading
+from collections import deque
+
+DEFAULT_COMPLETION_SIZE = 5000
+
+class PrefixIndex(object):
+    """Sorted array with the last 'size' words added, searched by prefix
+    with a binary search. It never grows beyond 'size' words"""
+
+    def __init__(self, words=None, size=DEFAULT_COMPLETION_SIZE):
+        self.size = size
+        self.words = []
+        self.order = deque()
+        self.lock = threading.Lock()
+        if words:
+            self.update(words)
+
+    def __add(self, word):
+        if isinstance(word, unicode):
+            word = word.encode('utf-8')
+        elif not isinstance(word, str):
+            word = str(word)
+        i = bisect.bisect_left(self.words, word)
+        if i < len(self.words) and self.words[i] == word:
+            return
+        self.words.insert(i, word)
+        self.order.append(word)
+        if len(self.order) > self.size:
+            old = self.order.popleft()
+            del self.words[bisect.bisect_left(self.words, old)]
+
+    def add(self, word):
+        if word:
+            self.update([word])
+
+    def update(self, words):
+        self.lock.acquire()
+        try:
+            for word in words:
+                if word:
+                    self.__add(word)
+        finally:
+            self.lock.release()
+
+    def complete(self, prefix):
+        """Returns the words starting with prefix in order"""
+        self.lock.acquire()
+        try:
+            rtn = []
+            i = bisect.bisect_left(self.words, prefix)
+            while i < len(self.words) and self.words[i].startswith(prefix):
+                rtn.append(self.words[i])
+                i += 1
+            return rtn
+        finally:
+            self.lock.release()
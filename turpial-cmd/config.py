@@ -12,13 +12,15 @@ from libturpial.config import ConfigBase, GLOBAL_CFG
 CMD_CFG = GLOBAL_CFG
 CMD_CFG['App']['version'] = '0.9.0-a1'
 
+CMD_DIR = os.path.join(os.path.expanduser('~'), '.config', 'turpial-cmd')
+
 class ConfigApp(ConfigBase):
     """Configuracion de la aplicacion"""
     
     def __init__(self):
         ConfigBase.__init__(self, default=CMD_CFG)
         
-        self.dir = os.path.join(os.path.expanduser('~'), '.config', 'turpial-cmd')
+        self.dir = CMD_DIR
         self.filepath = os.path.join(self.dir, 'global')
         
         if not os.path.isdir(self.dir): 
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""Statuses by id and reconstruction of conversations for turpial-cmd"""
+
+import threading
+from collections import OrderedDict
+
+from cache import id_key
+from common import DEFAULT_STATUS_CACHE_SIZE
+
+# Requests made at most to complete a conversation
+MAX_FETCHES = 10
+
+class ThreadError(Exception):
+    pass
+
+class StatusStore(object):
+    """LRU of the newest 'size' statuses seen by any command and account,
+    by network (the protocol, ids are unique per protocol) and id. It also
+    knows the stored replies of each status
+    """
+
+    def __init__(self, size=DEFAULT_STATUS_CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.statuses = OrderedDict()
+        self.replies = {}
+
+    def __parent(self, network, status):
+        if not getattr(status, 'in_reply_to_id', None):
+            return None
+        return (network, str(status.in_reply_to_id))
+
+    def get(self, network, id_):
+        key = (network, str(id_))
+        self.lock.acquire()
+        try:
+            status = self.statuses.pop(key, None)
+            if status is not None:
+                self.statuses[key] = status
+            return status
+        finally:
+            self.lock.release()
+
+    def add(self, network, statuses):
+        self.lock.acquire()
+        try:
+            for status in statuses:
+                key = (network, str(status.id_))
+                self.statuses.pop(key, None)
+                self.statuses[key] = status
+                parent = self.__parent(network, status)
+                if parent:
+                    self.replies.setdefault(parent, set()).add(key[1])
+            while len(self.statuses) > self.size:
+                key, status = self.statuses.popitem(last=False)
+                parent = self.__parent(key[0], status)
+                if parent in self.replies:
+                    self.replies[parent].discard(key[1])
+                    if not self.replies[parent]:
+                        del self.replies[parent]
+        finally:
+            self.lock.release()
+
+    def replies_to(self, network, id_):
+        """Returns the stored replies of the status, oldest first"""
+        self.lock.acquire()
+        try:
+            ids = list(self.replies.get((network, str(id_)), []))
+            statuses = [self.statuses.get((network, reply_id))
+                for reply_id in ids]
+        finally:
+            self.lock.release()
+        statuses = [status for status in statuses if status is not None]
+        statuses.sort(key=lambda status: id_key(status.id_))
+        return statuses
+
+class ThreadBuilder(object):
+    """Rebuild the conversation of a status from the store, asking
+    fetch(id_) only for the statuses missing in it. fetch must return a
+    libturpial Response with the status with that id and as many of its
+    ancestors as it can get (e.g. Core.get_conversation); they are all
+    stored
+    """
+
+    def __init__(self, store, network, fetch):
+        self.store = store
+        self.network = network
+        self.fetch = fetch
+        self.fetched = 0
+
+    def ancestors(self, id_):
+        """Returns the statuses from the first one of the conversation to
+        the one with that id"""
+        chain = []
+        seen = set()
+        while id_ and str(id_) not in seen:
+            seen.add(str(id_))
+            status = self.store.get(self.network, id_)
+            if status is None:
+                if self.fetched >= MAX_FETCHES:
+                    break
+                self.fetched += 1
+                rtn = self.fetch(id_)
+                if getattr(rtn, 'code', 0) > 0:
+                    raise ThreadError(rtn.errmsg)
+                self.store.add(self.network, rtn)
+                status = self.store.get(self.network, id_)
+                if status is None:
+                    # Deleted or protected, the conversation starts here
+                    break
+            chain.append(status)
+            id_ = getattr(status, 'in_reply_to_id', None)
+        chain.reverse()
+        return chain
+
+    def tree(self, id_):
+        """Returns the conversation as (depth, status) pairs in reading
+        order: the ancestors of the status and every stored reply to them"""
+        chain = self.ancestors(id_)
+        if not chain:
+            return []
+        nodes = []
+        pending = [(0, chain[0])]
+        seen = set()
+        while pending:
+            depth, status = pending.pop()
+            if str(status.id_) in seen:
+                continue
+            seen.add(str(status.id_))
+            nodes.append((depth, status))
+            replies = self.store.replies_to(self.network, status.id_)
+            pending.extend([(depth + 1, reply) for reply in reversed(replies)])
+        return nodes
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+"""Local store of the direct messages of the turpial-cmd accounts"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from cache import id_key
+from common import DEFAULT_DIRECTS_TTL
+
+class CachedDirect(object):
+    """Direct message restored from the store. username is the sender"""
+
+    def __init__(self, row):
+        (self.id_, self.partner, self.username, self.text, self.datetime,
+            self.timestamp, sent) = row
+        self.sent = bool(sent)
+
+class DirectStore(object):
+    """Keep the direct messages sent and received by each account in a
+    SQLite database, grouped by the other user of the conversation (the
+    partner): the sender of the received ones and the recipient of the
+    sent ones.
+
+    Each sync only adds the messages newer than the last one stored. The
+    messages of an account are fresh for 'ttl' seconds after its last sync
+    """
+
+    def __init__(self, filepath, ttl=DEFAULT_DIRECTS_TTL):
+        self.filepath = filepath
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        basedir = os.path.dirname(filepath)
+        if not os.path.isdir(basedir):
+            os.makedirs(basedir)
+
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS messages (
+            account TEXT, id_ TEXT, partner TEXT, sender TEXT, text TEXT,
+            datetime TEXT, timestamp REAL, sent INTEGER,
+            PRIMARY KEY (account, id_))''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS messages_partner
+            ON messages (account, partner, timestamp)''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS syncs (
+            account TEXT PRIMARY KEY, timestamp REAL, last_id TEXT)''')
+        self.conn.commit()
+
+    def __row(self, account, username, message, partner):
+        sender = message.username
+        sent = sender.lower() == username.lower()
+        if partner is None:
+            partner = sender
+            if sent:
+                partner = (getattr(message, 'recipient', None) or
+                    getattr(message, 'in_reply_to_user', None) or '')
+        timestamp = getattr(message, 'timestamp', None) or time.time()
+        return (account, str(message.id_), partner.lstrip('@'), sender,
+            message.text, message.datetime, timestamp, int(sent))
+
+    def last_sync(self, account):
+        """Returns the time of the last sync and the newest id stored"""
+        self.lock.acquire()
+        try:
+            row = self.conn.execute('''SELECT timestamp, last_id FROM syncs
+                WHERE account = ?''', (account, )).fetchone()
+        finally:
+            self.lock.release()
+        return row or (None, None)
+
+    def fresh(self, account):
+        timestamp = self.last_sync(account)[0]
+        return timestamp is not None and time.time() - timestamp < self.ttl
+
+    def add(self, account, username, messages, partner=None):
+        """Store the messages of the account (whose username is given to
+        tell the sent ones). partner is the recipient of all of them, when
+        it is known. Returns the number of new messages"""
+        rows = [self.__row(account, username, message, partner)
+            for message in messages]
+        self.lock.acquire()
+        try:
+            added = 0
+            for row in rows:
+                cursor = self.conn.execute('''INSERT OR IGNORE INTO messages
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', row)
+                added += max(0, cursor.rowcount)
+            self.conn.commit()
+        finally:
+            self.lock.release()
+        return added
+
+    def sync(self, account, username, messages):
+        """Add the messages downloaded in a sync. Returns the number of new
+        messages"""
+        messages = list(messages)
+        added = self.add(account, username, messages)
+        last_id = self.last_sync(account)[1]
+        for message in messages:
+            if last_id is None or id_key(message.id_) > id_key(last_id):
+                last_id = str(message.id_)
+        self.lock.acquire()
+        try:
+            self.conn.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)',
+                (account, time.time(), last_id))
+            self.conn.commit()
+        finally:
+            self.lock.release()
+        return added
+
+    def partners(self, account):
+        """Returns (partner, messages, received, last timestamp, last text)
+        for each partner, newest conversation first"""
+        self.lock.acquire()
+        try:
+            return self.conn.execute('''SELECT partner, COUNT(*),
+                COUNT(*) - SUM(sent), MAX(timestamp), (SELECT text FROM
+                messages newest WHERE newest.account = m.account AND
+                newest.partner = m.partner ORDER BY timestamp DESC LIMIT 1)
+                FROM messages m WHERE account = ? GROUP BY partner
+                ORDER BY MAX(timestamp) DESC''', (account, )).fetchall()
+        finally:
+            self.lock.release()
+
+    def thread(self, account, partner):
+        """Returns the messages with the partner, oldest first"""
+        self.lock.acquire()
+        try:
+            rows = self.conn.execute('''SELECT id_, partner, sender, text,
+                datetime, timestamp, sent FROM messages WHERE account = ? AND
+                lower(partner) = ? ORDER BY timestamp''', (account,
+                partner.lstrip('@').lower())).fetchall()
+        finally:
+            self.lock.release()
+        return [CachedDirect(row) for row in rows]
+
+    def ids(self, account, partner=None, first=None, last=None):
+        """Returns the ids of the stored messages with the partner and/or
+        between the ids first and last (both included)"""
+        query = 'SELECT id_ FROM messages WHERE account = ?'
+        args = [account]
+        if partner:
+            query += ' AND lower(partner) = ?'
+            args.append(partner.lstrip('@').lower())
+        self.lock.acquire()
+        try:
+            rows = self.conn.execute(query, args).fetchall()
+        finally:
+            self.lock.release()
+        ids = [row[0] for row in rows]
+        if first is not None:
+            ids = [id_ for id_ in ids if id_key(id_) >= id_key(first)]
+        if last is not None:
+            ids = [id_ for id_ in ids if id_key(id_) <= id_key(last)]
+        ids.sort(key=id_key)
+        return ids
+
+    def remove(self, account, ids):
+        self.lock.acquire()
+        try:
+            self.conn.executemany('''DELETE FROM messages WHERE account = ?
+                AND id_ = ?''', [(account, str(id_)) for id_ in ids])
+            self.conn.commit()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.conn.close()
+        finally:
+            self.lock.release()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""Streaming export of statuses to JSONL and CSV files for turpial-cmd"""
+
+import os
+import csv
+import gzip
+import json
+from collections import OrderedDict
+
+from cache import FIELDS, id_key
+
+FORMATS = ['jsonl', 'csv']
+
+def guess_format(filepath):
+    name = filepath
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+def encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+class StatusExporter(object):
+    """Write statuses one by one to a JSONL or CSV file, gzipped when
+    'compress' is True or the file ends with .gz. With 'resume' the
+    statuses are appended and the ones not newer than the last exported
+    are skipped
+    """
+
+    def __init__(self, filepath, format=None, compress=None, resume=False):
+        self.filepath = filepath
+        self.format = format or guess_format(filepath)
+        if compress is None:
+            compress = filepath.endswith('.gz')
+        self.compress = compress
+        self.last_id = None
+        self.written = 0
+        self.skipped = 0
+
+        exists = os.path.isfile(filepath) and os.path.getsize(filepath) > 0
+        if resume and exists:
+            self.last_id = self.__find_last_id()
+        mode = 'wb'
+        if resume:
+            mode = 'ab'
+        if compress:
+            self.fd = gzip.open(filepath, mode)
+        else:
+            self.fd = open(filepath, mode)
+        if self.format == 'csv':
+            self.writer = csv.writer(self.fd)
+            if not (resume and exists):
+                self.writer.writerow(FIELDS + ['account'])
+
+    def __open_read(self):
+        if self.compress:
+            return gzip.open(self.filepath, 'rb')
+        return open(self.filepath, 'rb')
+
+    def __find_last_id(self):
+        """Returns the newest id of the file reading it line by line"""
+        last = None
+        fd = self.__open_read()
+        try:
+            if self.format == 'csv':
+                rows = csv.reader(fd)
+                header = rows.next()
+                position = header.index('id_')
+                ids = (row[position] for row in rows if len(row) > position)
+            else:
+                ids = (json.loads(line)['id_'] for line in fd if line.strip())
+            for id_ in ids:
+                if last is None or id_key(id_) > id_key(last):
+                    last = id_
+        finally:
+            fd.close()
+        return last
+
+    def __record(self, status, account):
+        record = OrderedDict()
+        for field in FIELDS:
+            value = getattr(status, field, None)
+            if field == 'reposted_by' and isinstance(value, (list, tuple)):
+                value = ' '.join(value)
+            record[field] = value
+        record['id_'] = str(status.id_)
+        record['account'] = getattr(status, 'account_id', None) or account
+        return record
+
+    def write(self, status, account=None):
+        """Returns True if the status was exported"""
+        if self.last_id is not None and id_key(status.id_) <= id_key(self.last_id):
+            self.skipped += 1
+            return False
+        record = self.__record(status, account)
+        if self.format == 'csv':
+            self.writer.writerow([encode(record[field])
+                for field in FIELDS + ['account']])
+        else:
+            self.fd.write(json.dumps(record) + '\n')
+        self.written += 1
+        return True
+
+    def close(self):
+        self.fd.close()
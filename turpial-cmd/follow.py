@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""Background polling of columns for turpial-cmd"""
+
+import threading
+
+DEFAULT_INTERVAL = 60
+MIN_INTERVAL = 15
+MAX_INTERVAL = 600
+MAX_SEEN = 1000
+
+class Follower(threading.Thread):
+    """Poll a column of an account until it is stopped.
+
+    'poll' receives the account and the column and must return a tuple
+    (statuses, error) with the statuses newer than the previous call.
+    'notify' receives the follower, the new statuses (oldest first) and the
+    error message, if any. The statuses of the first successful poll only
+    seed the seen ones and aren't notified. The interval gets shorter while
+    the column has traffic and longer while it is quiet or the requests fail,
+    but never shorter than 'headroom' (the seconds between requests that
+    make the rate limit quota of the account last, if given)
+    """
+
+    def __init__(self, account, column, poll, notify, headroom=None,
+            interval=DEFAULT_INTERVAL):
+        threading.Thread.__init__(self, name='follow-%s-%s' % (account, column))
+        self.setDaemon(True)
+        self.account = account
+        self.column = column
+        self.poll = poll
+        self.notify = notify
+        self.headroom = headroom
+        self.interval = interval
+        self.seeded = False
+        self.finished = threading.Event()
+        self.seen = set()
+        self.seen_order = []
+
+    def __adapt(self, count, error):
+        if error:
+            interval = self.interval * 2
+        elif count > 0:
+            interval = self.interval / 2
+        else:
+            interval = self.interval * 1.5
+        return min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+
+    def __wait_time(self):
+        if not self.headroom:
+            return self.interval
+        try:
+            return max(self.interval, self.headroom(self.account))
+        except Exception:
+            return self.interval
+
+    def __filter(self, statuses):
+        fresh = []
+        for status in statuses:
+            id_ = str(status.id_)
+            if id_ in self.seen:
+                continue
+            self.seen.add(id_)
+            self.seen_order.append(id_)
+            fresh.append(status)
+        while len(self.seen_order) > MAX_SEEN:
+            self.seen.discard(self.seen_order.pop(0))
+        fresh.reverse()
+        return fresh
+
+    def run(self):
+        while not self.finished.isSet():
+            try:
+                statuses, error = self.poll(self.account, self.column)
+            except Exception, exc:
+                statuses, error = [], str(exc)
+            fresh = self.__filter(statuses)
+            if not self.seeded:
+                self.seeded = not error
+                fresh = []
+            if (fresh or error) and not self.finished.isSet():
+                self.notify(self, fresh, error)
+            self.interval = self.__adapt(len(fresh), error)
+            self.finished.wait(self.__wait_time())
+
+    def stop(self):
+        self.finished.set()
+
+class FollowManager(object):
+    """Keep track of the followed columns. 'headroom' receives an account
+    and returns the seconds between requests that make its quota last; the
+    followed columns of the same account share it"""
+
+    def __init__(self, poll, notify, headroom=None):
+        self.poll = poll
+        self.notify = notify
+        self.headroom = headroom
+        self.followers = {}
+
+    def __headroom(self, account):
+        if not self.headroom:
+            return 0
+        sharing = len([key for key in self.followers.keys() 
+            if key[0] == account])
+        return self.headroom(account) * max(1, sharing)
+
+    def follow(self, account, column):
+        """Returns False if the column was already followed"""
+        key = (account, column)
+        if key in self.followers and self.followers[key].isAlive():
+            return False
+        follower = Follower(account, column, self.poll, self.notify, 
+            self.__headroom)
+        self.followers[key] = follower
+        follower.start()
+        return True
+
+    def unfollow(self, account=None, column=None):
+        """Stop the followers matching account and column (all of them if
+        not given). Returns the number of stopped followers"""
+        count = 0
+        for key in self.followers.keys():
+            if account and key[0] != account:
+                continue
+            if column and key[1] != column:
+                continue
+            self.followers.pop(key).stop()
+            count += 1
+        return count
+
+    def active(self):
+        return sorted(self.followers.keys())
+
+    def stop_all(self, timeout=2):
+        followers = self.followers.values()
+        self.unfollow()
+        for follower in followers:
+            follower.join(timeout)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""Local store of the friends and followers of the turpial-cmd accounts"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from common import DEFAULT_GRAPH_TTL
+
+FRIEND = 'friend'
+FOLLOWER = 'follower'
+
+class FriendGraph(object):
+    """Keep the friends of each account and the followers found with
+    'friend check' in a SQLite database, with an in-memory copy of the
+    accounts in use so lookups don't touch the disk.
+
+    Syncing a friend list only writes the users that were added or removed,
+    and each of those changes is logged so they can be shown later without
+    asking the server again. Data older than 'ttl' seconds is stale
+    """
+
+    def __init__(self, filepath, ttl=DEFAULT_GRAPH_TTL):
+        self.filepath = filepath
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.friends = {}
+        self.followers = {}
+
+        basedir = os.path.dirname(filepath)
+        if not os.path.isdir(basedir):
+            os.makedirs(basedir)
+
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS friends (
+            account TEXT, username TEXT, fullname TEXT,
+            PRIMARY KEY (account, username))''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS followers (
+            account TEXT, username TEXT, following INTEGER, checked REAL,
+            PRIMARY KEY (account, username))''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS syncs (
+            account TEXT PRIMARY KEY, timestamp REAL)''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS changes (
+            account TEXT, kind TEXT, username TEXT, added INTEGER,
+            timestamp REAL)''')
+        self.conn.commit()
+
+    def __load(self, account):
+        if account in self.friends:
+            return
+        rows = self.conn.execute('''SELECT username, fullname FROM friends
+            WHERE account = ?''', (account, )).fetchall()
+        self.friends[account] = dict([(row[0].lower(), row) for row in rows])
+        rows = self.conn.execute('''SELECT username, following, checked
+            FROM followers WHERE account = ?''', (account, )).fetchall()
+        self.followers[account] = dict([(row[0].lower(), (bool(row[1]),
+            row[2])) for row in rows])
+
+    def __log(self, account, kind, username, added, now):
+        self.conn.execute('INSERT INTO changes VALUES (?, ?, ?, ?, ?)',
+            (account, kind, username, int(added), now))
+
+    def last_sync(self, account):
+        self.lock.acquire()
+        try:
+            row = self.conn.execute('''SELECT timestamp FROM syncs
+                WHERE account = ?''', (account, )).fetchone()
+        finally:
+            self.lock.release()
+        return row and row[0] or None
+
+    def fresh(self, account):
+        synced = self.last_sync(account)
+        return synced is not None and time.time() - synced < self.ttl
+
+    def list(self, account):
+        """Returns the (username, fullname) of the friends of account"""
+        self.lock.acquire()
+        try:
+            self.__load(account)
+            return sorted(self.friends[account].values(),
+                key=lambda row: row[0].lower())
+        finally:
+            self.lock.release()
+
+    def sync(self, account, friends):
+        """Replace the friends of account with the (username, fullname)
+        list given. Returns the usernames added and removed"""
+        now = time.time()
+        self.lock.acquire()
+        try:
+            self.__load(account)
+            # The first sync of an account is not a change
+            first = self.conn.execute('''SELECT timestamp FROM syncs
+                WHERE account = ?''', (account, )).fetchone() is None
+            current = self.friends[account]
+            new = dict([(username.lower(), (username, fullname))
+                for username, fullname in friends])
+            added = [new[key][0] for key in new if key not in current]
+            removed = [current[key][0] for key in current if key not in new]
+
+            for username in added:
+                self.conn.execute('INSERT OR REPLACE INTO friends VALUES (?, ?, ?)',
+                    (account, ) + new[username.lower()])
+                if not first:
+                    self.__log(account, FRIEND, username, True, now)
+            for username in removed:
+                self.conn.execute('''DELETE FROM friends WHERE account = ?
+                    AND username = ?''', (account, username))
+                if not first:
+                    self.__log(account, FRIEND, username, False, now)
+            self.conn.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?)',
+                (account, now))
+            self.conn.commit()
+            self.friends[account] = new
+        finally:
+            self.lock.release()
+        return sorted(added), sorted(removed)
+
+    def set_friend(self, account, username, following, fullname=None):
+        """Record a follow or unfollow done by the account"""
+        self.lock.acquire()
+        try:
+            self.__load(account)
+            key = username.lower()
+            if following == (key in self.friends[account]):
+                return
+            if following:
+                self.friends[account][key] = (username, fullname or '')
+                self.conn.execute('INSERT OR REPLACE INTO friends VALUES (?, ?, ?)',
+                    (account, username, fullname or ''))
+            else:
+                username = self.friends[account].pop(key)[0]
+                self.conn.execute('''DELETE FROM friends WHERE account = ?
+                    AND username = ?''', (account, username))
+            self.__log(account, FRIEND, username, following, time.time())
+            self.conn.commit()
+        finally:
+            self.lock.release()
+
+    def is_follower(self, account, username):
+        """Returns True or False if it is known whether username follows the
+        account and the answer is not stale, None otherwise"""
+        self.lock.acquire()
+        try:
+            self.__load(account)
+            value = self.followers[account].get(username.lower())
+        finally:
+            self.lock.release()
+        if value is None or time.time() - value[1] >= self.ttl:
+            return None
+        return value[0]
+
+    def set_follower(self, account, username, following):
+        now = time.time()
+        following = bool(following)
+        self.lock.acquire()
+        try:
+            self.__load(account)
+            previous = self.followers[account].get(username.lower())
+            self.followers[account][username.lower()] = (following, now)
+            self.conn.execute('INSERT OR REPLACE INTO followers VALUES (?, ?, ?, ?)',
+                (account, username, int(following), now))
+            if previous is not None and previous[0] != following:
+                self.__log(account, FOLLOWER, username, following, now)
+            self.conn.commit()
+        finally:
+            self.lock.release()
+
+    def changes(self, account, since=None):
+        """Returns the (kind, username, added, timestamp) changes of account
+        since the given timestamp, by default the ones of the last sync"""
+        if since is None:
+            since = self.last_sync(account) or 0
+        self.lock.acquire()
+        try:
+            return self.conn.execute('''SELECT kind, username, added, timestamp
+                FROM changes WHERE account = ? AND timestamp >= ?
+                ORDER BY timestamp, username''', (account, since)).fetchall()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.conn.close()
+        finally:
+            self.lock.release()
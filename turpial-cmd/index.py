@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""Local full-text index of the statuses seen by turpial-cmd"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from cache import CachedStatus, FIELDS
+
+DEFAULT_INDEX_SIZE = 20000
+
+class StatusIndex(object):
+    """Index text, author, client and date of statuses in a SQLite database
+    so they can be searched without network. Full-text search uses FTS4
+    when SQLite supports it and falls back to LIKE otherwise. Only the
+    newest 'size' statuses are kept
+    """
+
+    def __init__(self, filepath, size=DEFAULT_INDEX_SIZE):
+        self.filepath = filepath
+        self.size = size
+        self.lock = threading.Lock()
+
+        basedir = os.path.dirname(filepath)
+        if not os.path.isdir(basedir):
+            os.makedirs(basedir)
+
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS statuses (
+            id_ TEXT, username TEXT, text TEXT, source TEXT, datetime TEXT,
+            timestamp REAL, in_reply_to_id TEXT, in_reply_to_user TEXT,
+            reposted_by TEXT, account TEXT, PRIMARY KEY (account, id_))''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS statuses_time
+            ON statuses (timestamp)''')
+        try:
+            self.conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS search
+                USING fts4(text, username, source)''')
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self.conn.commit()
+
+    def __row(self, account, status):
+        reposted_by = status.reposted_by
+        if isinstance(reposted_by, (list, tuple)):
+            reposted_by = ' '.join(reposted_by)
+        timestamp = getattr(status, 'timestamp', None) or time.time()
+        account = getattr(status, 'account_id', None) or account
+        return (str(status.id_), status.username, status.text, status.source,
+            status.datetime, timestamp, status.in_reply_to_id,
+            status.in_reply_to_user, reposted_by or None, account)
+
+    def __evict(self):
+        row = self.conn.execute('''SELECT timestamp FROM statuses
+            ORDER BY timestamp DESC LIMIT 1 OFFSET ?''', (self.size, )).fetchone()
+        if not row:
+            return
+        if self.fts:
+            self.conn.execute('''DELETE FROM search WHERE docid IN (SELECT
+                rowid FROM statuses WHERE timestamp <= ?)''', row)
+        self.conn.execute('DELETE FROM statuses WHERE timestamp <= ?', row)
+
+    def add(self, account, statuses):
+        """Index the statuses. Returns the number of new statuses"""
+        rows = [self.__row(account, status) for status in statuses]
+        if not rows:
+            return 0
+        self.lock.acquire()
+        try:
+            added = 0
+            for row in rows:
+                cursor = self.conn.execute('''INSERT OR IGNORE INTO statuses
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', row)
+                if cursor.rowcount < 1:
+                    continue
+                added += 1
+                if self.fts:
+                    self.conn.execute('''INSERT INTO search (docid, text,
+                        username, source) VALUES (?, ?, ?, ?)''',
+                        (cursor.lastrowid, row[2], row[1], row[3]))
+            self.__evict()
+            self.conn.commit()
+        finally:
+            self.lock.release()
+        return added
+
+    def search(self, query, account=None, author=None, since=None,
+            until=None, count=None):
+        """Returns the newest indexed statuses matching all the words of
+        query. since and until are Unix timestamps"""
+        words = [word.replace('"', '') for word in query.split()]
+        words = [word for word in words if word]
+        conditions = []
+        args = []
+        if self.fts and words:
+            conditions.append('''s.rowid IN (SELECT docid FROM search WHERE
+                search MATCH ?)''')
+            args.append(' '.join(['"%s"' % word for word in words]))
+        else:
+            for word in words:
+                conditions.append('(s.text LIKE ? OR s.username LIKE ?)')
+                args += ['%%%s%%' % word] * 2
+        if account:
+            conditions.append('s.account = ?')
+            args.append(account)
+        if author:
+            conditions.append('lower(s.username) = ?')
+            args.append(author.lstrip('@').lower())
+        if since:
+            conditions.append('s.timestamp >= ?')
+            args.append(since)
+        if until:
+            conditions.append('s.timestamp < ?')
+            args.append(until)
+
+        query = 'SELECT %s FROM statuses s' % ', '.join(['s.' + field
+            for field in FIELDS + ['account']])
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY s.timestamp DESC'
+        if count:
+            query += ' LIMIT ?'
+            args.append(count)
+
+        self.lock.acquire()
+        try:
+            rows = self.conn.execute(query, args).fetchall()
+        finally:
+            self.lock.release()
+        return [CachedStatus(row) for row in rows]
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.conn.close()
+        finally:
+            self.lock.release()
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""Background execution of commands (jobs) for turpial-cmd"""
+
+import time
+import thread
+import threading
+from StringIO import StringIO
+
+# Finished jobs kept to be listed
+MAX_FINISHED = 20
+
+RUNNING = 'Running'
+DONE = 'Done'
+FAILED = 'Failed'
+CANCELLED = 'Cancelled'
+
+class JobCancelled(Exception):
+    pass
+
+class ThreadState(object):
+    """Attribute shared by all the threads but the ones that set their own
+    value in the 'local' (a threading.local) of the instance. It needs a
+    new-style class"""
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.default = default
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        return getattr(obj.local, self.name,
+            obj.__dict__.get(self.name, self.default))
+
+    def __set__(self, obj, value):
+        if hasattr(obj.local, self.name):
+            setattr(obj.local, self.name, value)
+        else:
+            obj.__dict__[self.name] = value
+
+class ThreadOutput(object):
+    """Replacement of sys.stdout that sends what is written by each job
+    thread to its buffer and everything else to 'stream'"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+
+    def capture(self, buf):
+        self.buffers[thread.get_ident()] = buf
+
+    def release(self):
+        self.buffers.pop(thread.get_ident(), None)
+
+    def target(self):
+        """Returns the stream where the output of this thread goes"""
+        return self.buffers.get(thread.get_ident(), self.stream)
+
+    def write(self, text):
+        self.target().write(text)
+
+    def flush(self):
+        self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+class Job(object):
+    def __init__(self, id_, line):
+        self.id_ = id_
+        self.line = line
+        self.output = StringIO()
+        self.state = RUNNING
+        self.start = time.time()
+        self.end = None
+        self.collected = False
+        self.finished = threading.Event()
+
+    def running(self):
+        return self.state == RUNNING
+
+    def elapsed(self):
+        return (self.end or time.time()) - self.start
+
+class JobManager(object):
+    """Run commands in background threads. notify(job) is called from the
+    job thread when it finishes, unless it was cancelled or someone is
+    waiting for it. It is called before wait(job) returns
+    """
+
+    def __init__(self, notify):
+        self.notify = notify
+        self.lock = threading.Lock()
+        self.jobs = []
+        self.next_id = 1
+        self.local = threading.local()
+
+    def __run(self, job, func):
+        self.local.job = job
+        try:
+            rtn = func(job)
+        except JobCancelled:
+            rtn = False
+        except Exception, exc:
+            job.output.write('Unexpected error: %s\n' % exc)
+            rtn = False
+
+        self.lock.acquire()
+        try:
+            if job.running():
+                job.state = DONE
+                if rtn is False:
+                    job.state = FAILED
+                job.end = time.time()
+            finished = [j for j in self.jobs if not j.running()]
+            for old in finished[:-MAX_FINISHED]:
+                self.jobs.remove(old)
+            notify = job.state != CANCELLED and not job.collected
+        finally:
+            self.lock.release()
+        if notify:
+            self.notify(job)
+        job.finished.set()
+
+    def start(self, line, func):
+        """Run func(job) in a new thread. It must return False when the
+        command fails"""
+        self.lock.acquire()
+        try:
+            job = Job(self.next_id, line)
+            self.next_id += 1
+            self.jobs.append(job)
+        finally:
+            self.lock.release()
+        th = threading.Thread(target=self.__run, args=(job, func))
+        th.setDaemon(True)
+        th.start()
+        return job
+
+    def list(self):
+        self.lock.acquire()
+        try:
+            return list(self.jobs)
+        finally:
+            self.lock.release()
+
+    def get(self, id_=None):
+        """Returns the job with that id (the newest one by default) or None"""
+        jobs = self.list()
+        if id_ is None:
+            return jobs and jobs[-1] or None
+        for job in jobs:
+            if job.id_ == id_:
+                return job
+        return None
+
+    def running(self):
+        return [job for job in self.list() if job.running()]
+
+    def current(self):
+        """Returns the job running in this thread or None"""
+        return getattr(self.local, 'job', None)
+
+    def bind(self, func):
+        """Returns func running on behalf of the job of this thread, so the
+        calls it makes from other threads (e.g. a worker pool) stop when the
+        job is cancelled"""
+        job = self.current()
+        if job is None:
+            return func
+
+        def call(*args, **kwargs):
+            previous = self.current()
+            self.local.job = job
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.local.job = previous
+        return call
+
+    def wait(self, job):
+        """Block until the job finishes. Its output won't be notified,
+        unless it finished before being collected"""
+        self.lock.acquire()
+        try:
+            job.collected = True
+        finally:
+            self.lock.release()
+        # Waiting in short steps keeps Ctrl+C working
+        while not job.finished.isSet():
+            job.finished.wait(0.1)
+
+    def cancel(self, job):
+        """Mark the job as cancelled. Its threads stop at their next Core call
+        and its output is discarded"""
+        self.lock.acquire()
+        try:
+            if not job.running():
+                return False
+            job.state = CANCELLED
+            job.end = time.time()
+            return True
+        finally:
+            self.lock.release()
+
+    def stop_all(self, timeout=2):
+        """Cancel the running jobs and wait up to timeout seconds for their
+        threads to finish"""
+        jobs = self.running()
+        for job in jobs:
+            self.cancel(job)
+        deadline = time.time() + timeout
+        for job in jobs:
+            job.finished.wait(max(0, deadline - time.time()))
+
+class CancellableCore(object):
+    """Proxy of Core that stops the calls made by cancelled jobs"""
+
+    def __init__(self, core, jobs):
+        self.core = core
+        self.jobs = jobs
+
+    def __getattr__(self, name):
+        attr = getattr(self.core, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            job = self.jobs.current()
+            if job is not None and job.state == CANCELLED:
+                raise JobCancelled()
+            return attr(*args, **kwargs)
+        return call
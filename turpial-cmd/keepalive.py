@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""urllib2 handlers that keep HTTP connections alive in a ConnectionPool.
+They are loaded only when Core is, as urllib2 is slow to import"""
+
+import errno
+import socket
+import httplib
+import urllib2
+from StringIO import StringIO
+
+# Errors of a connection closed by the server while it was idle
+STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+def stale(exc):
+    """True when exc means the server closed the connection before taking
+    the request, so it is safe to send it again. Timeouts are not: the
+    request may have been processed"""
+    if isinstance(exc, httplib.BadStatusLine):
+        return True
+    return (isinstance(exc, socket.error) and
+        not isinstance(exc, socket.timeout) and exc.errno in STALE_ERRNOS)
+
+class KeepAliveMixin(object):
+    """Open urllib2 requests over the connections of a ConnectionPool. The
+    body is read at once, so the connection goes back to the pool before
+    the response is returned"""
+
+    def __send(self, conn, req):
+        headers = dict(req.unredirected_hdrs)
+        headers.update(req.headers)
+        headers['Connection'] = 'keep-alive'
+        headers = dict([(name.title(), value) for name, value in headers.items()])
+        conn.request(req.get_method(), req.get_selector(), req.data, headers)
+        return conn.getresponse()
+
+    def keep_alive_open(self, connection_class, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+        key = self.pool.key(req.get_type(), host)
+        conn = self.pool.get(key)
+        try:
+            resp = None
+            if conn is not None:
+                try:
+                    resp = self.__send(conn, req)
+                except (socket.error, httplib.HTTPException), exc:
+                    if not stale(exc):
+                        raise
+                    conn.close()
+            if resp is None:
+                conn = connection_class(host, timeout=req.timeout)
+                self.pool.opened_one()
+                resp = self.__send(conn, req)
+            body = resp.read()
+        except (socket.error, httplib.HTTPException), exc:
+            if conn is not None:
+                conn.close()
+            raise urllib2.URLError(exc)
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self.pool.put(key, conn)
+
+        rtn = urllib2.addinfourl(StringIO(body), resp.msg, req.get_full_url())
+        rtn.code = resp.status
+        rtn.msg = resp.reason
+        return rtn
+
+class KeepAliveHTTPHandler(KeepAliveMixin, urllib2.HTTPHandler):
+    def __init__(self, pool):
+        urllib2.HTTPHandler.__init__(self)
+        self.pool = pool
+
+    def http_open(self, req):
+        return self.keep_alive_open(httplib.HTTPConnection, req)
+
+class KeepAliveHTTPSHandler(KeepAliveMixin, urllib2.HTTPSHandler):
+    def __init__(self, pool):
+        urllib2.HTTPSHandler.__init__(self)
+        self.pool = pool
+
+    def https_open(self, req):
+        return self.keep_alive_open(httplib.HTTPSConnection, req)
+
+def build_opener(pool):
+    return urllib2.build_opener(KeepAliveHTTPHandler(pool),
+        KeepAliveHTTPSHandler(pool))
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+"""Latency instrumentation of commands and Core calls for turpial-cmd"""
+
+import time
+import threading
+
+# Upper bounds (in milliseconds) of the histogram buckets
+BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.errors = {}
+        self.size = 0
+
+    def add(self, elapsed, error=None):
+        ms = elapsed * 1000
+        i = 0
+        while i < len(BUCKETS) and ms > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += elapsed
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def failed(self):
+        return sum(self.errors.values())
+
+    def average(self):
+        if self.count == 0:
+            return 0
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """Returns the upper bound (in ms) of the bucket holding the
+        percentile or None if it is beyond the last bucket"""
+        limit = self.count * percent / 100.0
+        accumulated = 0
+        for i in range(len(BUCKETS)):
+            accumulated += self.counts[i]
+            if accumulated >= limit:
+                return BUCKETS[i]
+        return None
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'seconds': self.total,
+            'errors': self.errors,
+            'size': self.size,
+            'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'],
+                self.counts)),
+        }
+
+class Metrics(object):
+    """Collect wall time of each command split in network (time spent in
+    Core calls) and render (everything else), and latency, response size
+    and error codes of each Core call"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = {}
+        self.network = {}
+        self.render = {}
+        self.calls = {}
+        self.local = threading.local()
+
+    def __histogram(self, group, name):
+        if name not in group:
+            group[name] = Histogram()
+        return group[name]
+
+    def begin_command(self):
+        self.local.network = 0.0
+
+    def end_command(self, name, elapsed, failed):
+        network = min(getattr(self.local, 'network', 0.0), elapsed)
+        self.lock.acquire()
+        try:
+            error = None
+            if failed:
+                error = 'failed'
+            self.__histogram(self.commands, name).add(elapsed, error)
+            self.__histogram(self.network, name).add(network)
+            self.__histogram(self.render, name).add(elapsed - network)
+        finally:
+            self.lock.release()
+
+    def add_call(self, name, elapsed, error=None, size=None):
+        if hasattr(self.local, 'network'):
+            self.local.network += elapsed
+        self.lock.acquire()
+        try:
+            histogram = self.__histogram(self.calls, name)
+            histogram.add(elapsed, error)
+            if size:
+                histogram.size += size
+        finally:
+            self.lock.release()
+
+    def add_remote(self, elapsed):
+        """Add network time spent by other threads on behalf of the command
+        running in this one"""
+        if hasattr(self.local, 'network'):
+            self.local.network += elapsed
+
+    def to_dict(self):
+        self.lock.acquire()
+        try:
+            groups = [('commands', self.commands), ('network', self.network),
+                ('render', self.render), ('core', self.calls)]
+            return dict([(key, dict([(name, h.to_dict())
+                for name, h in group.items()])) for key, group in groups])
+        finally:
+            self.lock.release()
+
+    def to_json(self):
+        import json
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        lines = []
+        data = self.to_dict()
+        metrics = [
+            ('commands', 'turpial_cmd_command_seconds', 'command'),
+            ('network', 'turpial_cmd_command_network_seconds', 'command'),
+            ('render', 'turpial_cmd_command_render_seconds', 'command'),
+            ('core', 'turpial_cmd_core_call_seconds', 'call'),
+        ]
+        for key, metric, label in metrics:
+            lines.append('# TYPE %s histogram' % metric)
+            for name in sorted(data[key].keys()):
+                values = data[key][name]
+                accumulated = 0
+                for bound in BUCKETS:
+                    accumulated += values['buckets'][str(bound)]
+                    lines.append('%s_bucket{%s="%s",le="%s"} %i' % (metric,
+                        label, name, bound / 1000.0, accumulated))
+                lines.append('%s_bucket{%s="%s",le="+Inf"} %i' % (metric,
+                    label, name, values['count']))
+                lines.append('%s_sum{%s="%s"} %f' % (metric, label, name,
+                    values['seconds']))
+                lines.append('%s_count{%s="%s"} %i' % (metric, label, name,
+                    values['count']))
+
+        lines.append('# TYPE turpial_cmd_core_errors_total counter')
+        lines.append('# TYPE turpial_cmd_core_response_items_total counter')
+        for name in sorted(data['core'].keys()):
+            values = data['core'][name]
+            for code, count in sorted(values['errors'].items()):
+                lines.append('turpial_cmd_core_errors_total{call="%s",code="%s"} %i' % (
+                    name, code, count))
+            lines.append('turpial_cmd_core_response_items_total{call="%s"} %i' % (
+                name, values['size']))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, filepath, format='json'):
+        fd = open(filepath, 'w')
+        try:
+            if format == 'prometheus':
+                fd.write(self.to_prometheus())
+            else:
+                fd.write(self.to_json())
+        finally:
+            fd.close()
+
+class InstrumentedCore(object):
+    """Proxy of Core that records every call in a Metrics object. When 'log'
+    is given each call is also logged in debug level"""
+
+    def __init__(self, core, metrics, log=None):
+        self.core = core
+        self.metrics = metrics
+        self.log = log
+
+    def __getattr__(self, name):
+        attr = getattr(self.core, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.time()
+            try:
+                rtn = attr(*args, **kwargs)
+            except Exception, exc:
+                self.metrics.add_call(name, time.time() - start,
+                    exc.__class__.__name__)
+                raise
+            elapsed = time.time() - start
+
+            error = None
+            code = getattr(rtn, 'code', 0)
+            if code > 0:
+                error = str(code)
+            try:
+                size = len(rtn)
+            except TypeError:
+                size = None
+            self.metrics.add_call(name, elapsed, error, size)
+            # Only the first argument (usually the account) is logged, the
+            # rest may hold passwords or private messages
+            if self.log:
+                self.log.debug('core.%s(%s) %.1fms code=%s size=%s' % (name,
+                    args and args[0] or '', elapsed * 1000, code, size))
+            return rtn
+        return call
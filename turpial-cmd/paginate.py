@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""Pagination of columns and searches for turpial-cmd"""
+
+import time
+import threading
+from Queue import Queue, Empty, Full
+
+from cache import id_key
+from common import DEFAULT_PREFETCH
+
+class PageError(Exception):
+    pass
+
+def accepts(func, name):
+    """True when func can be called with the keyword argument name"""
+    # inspect is slow to import and only needed once Core is loaded
+    import inspect
+    try:
+        spec = inspect.getargspec(func)
+    except TypeError:
+        return False
+    return name in spec.args or spec.keywords is not None
+
+class Paginator(object):
+    """Iterate over the statuses of a column or search walking back page by
+    page with max_id, until 'pages' pages (None for no limit), a status
+    older than 'until' (Unix timestamp) or the status 'until_id' are
+    reached.
+
+    fetch(max_id, count) must return a libturpial Response. The pages are
+    requested by another thread up to 'prefetch' pages ahead, but only
+    while can_prefetch() is True (e.g. there is rate limit quota left).
+    When the backend doesn't support max_id ('cursor' False) the whole
+    depth is asked in a single request
+    """
+
+    def __init__(self, fetch, count, pages=1, until=None, until_id=None,
+            cursor=True, prefetch=DEFAULT_PREFETCH, can_prefetch=None):
+        self.fetch = fetch
+        self.count = count
+        self.pages = pages
+        self.until = until
+        self.until_id = until_id
+        self.cursor = cursor
+        self.prefetch = max(1, prefetch)
+        self.can_prefetch = can_prefetch or (lambda: True)
+        self.fetched = 0
+
+    def __put(self, queue, stop, item):
+        # The consumer stops reading when it has enough statuses
+        while not stop.isSet():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def __produce(self, queue, stop):
+        max_id = None
+        while not stop.isSet():
+            if self.pages is not None and self.fetched >= self.pages:
+                break
+            # Ask for pages ahead only while it doesn't delay other requests
+            while (not stop.isSet() and not queue.empty() and
+                    not self.can_prefetch()):
+                time.sleep(0.1)
+
+            try:
+                if self.cursor:
+                    rtn = self.fetch(max_id, self.count)
+                else:
+                    rtn = self.fetch(None, self.count * (self.pages or 1))
+                    self.pages = 1
+                if getattr(rtn, 'code', 0) > 0:
+                    raise PageError(rtn.errmsg)
+                page = list(rtn)
+            except Exception, exc:
+                page = exc
+            self.fetched += 1
+
+            self.__put(queue, stop, page)
+            if isinstance(page, Exception) or not page:
+                break
+            max_id = page[-1].id_
+            if str(max_id).isdigit():
+                max_id = str(int(max_id) - 1)
+        self.__put(queue, stop, None)
+
+    def __iter__(self):
+        queue = Queue(self.prefetch)
+        stop = threading.Event()
+        th = threading.Thread(target=self.__produce, args=(queue, stop))
+        th.setDaemon(True)
+        th.start()
+
+        boundary = None
+        try:
+            while 1:
+                page = queue.get()
+                if page is None:
+                    return
+                if isinstance(page, Exception):
+                    raise page
+                for status in page:
+                    # Backends whose max_id is inclusive repeat the last
+                    # status of the previous page
+                    if (boundary is not None and
+                            id_key(status.id_) >= id_key(boundary)):
+                        continue
+                    if self.until_id and id_key(status.id_) <= id_key(self.until_id):
+                        return
+                    timestamp = getattr(status, 'timestamp', None)
+                    if self.until and timestamp and timestamp < self.until:
+                        return
+                    yield status
+                if page:
+                    boundary = page[-1].id_
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting for room in the queue
+            try:
+                while 1:
+                    queue.get_nowait()
+            except Empty:
+                pass
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""Persistent HTTP connections for the Core calls of turpial-cmd"""
+
+import time
+import threading
+
+from common import DEFAULT_POOL_SIZE, DEFAULT_IDLE_TIMEOUT
+
+class ConnectionPool(object):
+    """Keep up to 'size' idle connections for each account and server,
+    closing the ones unused for more than 'idle_timeout' seconds. The
+    account is the one set in the current thread with set_account
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.opened = 0
+        self.reused = 0
+        self.local = threading.local()
+
+    def set_account(self, account):
+        self.local.account = account
+
+    def key(self, scheme, host):
+        return (getattr(self.local, 'account', None), scheme, host)
+
+    def get(self, key):
+        """Returns an idle connection for key or None"""
+        now = time.time()
+        self.lock.acquire()
+        try:
+            connections = self.idle.get(key, [])
+            while connections:
+                conn, used = connections.pop()
+                if now - used < self.idle_timeout:
+                    self.reused += 1
+                    return conn
+                conn.close()
+            return None
+        finally:
+            self.lock.release()
+
+    def opened_one(self):
+        self.lock.acquire()
+        try:
+            self.opened += 1
+        finally:
+            self.lock.release()
+
+    def put(self, key, conn):
+        self.lock.acquire()
+        try:
+            connections = self.idle.setdefault(key, [])
+            if len(connections) < self.size:
+                connections.append((conn, time.time()))
+                return
+        finally:
+            self.lock.release()
+        conn.close()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            for connections in self.idle.values():
+                for conn, used in connections:
+                    conn.close()
+            self.idle = {}
+        finally:
+            self.lock.release()
+
+class PooledCore(object):
+    """Proxy of Core that sets the account of each call in the pool, so its
+    requests reuse the connections of that account"""
+
+    def __init__(self, core, pool):
+        self.core = core
+        self.pool = pool
+
+    def __getattr__(self, name):
+        attr = getattr(self.core, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            if args and isinstance(args[0], basestring):
+                self.pool.set_account(args[0])
+            return attr(*args, **kwargs)
+        return call
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""LRU cache of user profiles for turpial-cmd"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from common import DEFAULT_PROFILE_CACHE_SIZE, DEFAULT_PROFILE_TTL
+
+FIELDS = ['username', 'fullname', 'protected', 'following', 'url',
+    'location', 'bio', 'last_update']
+
+class CachedProfile(object):
+    """Profile restored from disk with the same attributes as the libturpial
+    one"""
+
+    def __init__(self, values):
+        for field in FIELDS:
+            setattr(self, field, values.get(field))
+
+class ProfileCache(object):
+    """Keep the newest 'size' profiles seen by each account for 'ttl'
+    seconds, evicting the least recently used first. When 'filepath' is
+    given the cache is loaded from it and saved on close
+    """
+
+    def __init__(self, size=DEFAULT_PROFILE_CACHE_SIZE, ttl=DEFAULT_PROFILE_TTL,
+            filepath=None):
+        self.size = size
+        self.ttl = ttl
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        if filepath and os.path.isfile(filepath):
+            self.__load()
+
+    def __key(self, account, username):
+        return (account, username.lstrip('@').lower())
+
+    def __load(self):
+        import json
+        try:
+            fd = open(self.filepath, 'r')
+            try:
+                rows = json.load(fd)
+            finally:
+                fd.close()
+        except (IOError, ValueError):
+            return
+        now = time.time()
+        for account, values, timestamp in rows:
+            if now - timestamp < self.ttl:
+                self.entries[self.__key(account, values['username'])] = (
+                    CachedProfile(values), timestamp)
+
+    def get(self, account, username):
+        """Returns the profile or None if it isn't cached or has expired"""
+        key = self.__key(account, username)
+        self.lock.acquire()
+        try:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            if time.time() - entry[1] >= self.ttl:
+                return None
+            self.entries[key] = entry
+            return entry[0]
+        finally:
+            self.lock.release()
+
+    def put(self, account, profile):
+        key = self.__key(account, profile.username)
+        self.lock.acquire()
+        try:
+            self.entries.pop(key, None)
+            self.entries[key] = (profile, time.time())
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        finally:
+            self.lock.release()
+
+    def invalidate(self, account, username):
+        self.lock.acquire()
+        try:
+            self.entries.pop(self.__key(account, username), None)
+        finally:
+            self.lock.release()
+
+    def save(self):
+        if not self.filepath:
+            return
+        self.lock.acquire()
+        try:
+            rows = [(account, dict([(field, getattr(profile, field, None))
+                for field in FIELDS]), timestamp)
+                for (account, name), (profile, timestamp) in self.entries.items()]
+        finally:
+            self.lock.release()
+        basedir = os.path.dirname(self.filepath)
+        if not os.path.isdir(basedir):
+            os.makedirs(basedir)
+        import json
+        fd = open(self.filepath, 'w')
+        try:
+            json.dump(rows, fd, default=unicode)
+        finally:
+            fd.close()
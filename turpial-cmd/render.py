@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""Streaming renderer of statuses for turpial-cmd"""
+
+import sys
+
+from common import DEFAULT_PAGE_SIZE
+
+class StatusRenderer(object):
+    """Format statuses from any iterable (lists, responses or generators)
+    page by page. Each page is written to 'out' with a single call, so the
+    first page is shown as soon as its statuses are available.
+
+    In pager mode the user is asked before rendering each following page
+    """
+
+    def __init__(self, out=None, page_size=DEFAULT_PAGE_SIZE, pager=False):
+        self.out = out
+        self.page_size = max(1, page_size)
+        self.pager = pager
+
+    def format(self, count, status):
+        text = status.text.replace('\n', ' ')
+        author = '@%s' % status.username
+        # Statuses merged from several accounts are tagged with their account
+        if getattr(status, 'tag', None):
+            author = '[%s] %s' % (status.tag, author)
+        lines = ["%d. %s: %s (id: %s)" % (count, author, text, status.id_)]
+
+        line = status.datetime
+        if status.source:
+            line = '%s from %s' % (line, status.source)
+        if status.in_reply_to_user:
+            line = '%s in reply to %s' % (line, status.in_reply_to_user)
+        lines.append(line)
+
+        if status.reposted_by:
+            reposted_by = status.reposted_by
+            if isinstance(reposted_by, (list, tuple)):
+                reposted_by = ', '.join(reposted_by)
+            lines.append('Retweeted by %s' % reposted_by)
+        lines.append('\n')
+        return '\n'.join(lines)
+
+    def __write(self, page):
+        # sys.stdout is looked up on each write, it may be replaced
+        out = self.out or sys.stdout
+        out.write(''.join(page))
+        out.flush()
+
+    def __more(self):
+        answer = raw_input('-- More (Enter to continue, q to quit) -- ')
+        return answer.lower() != 'q'
+
+    def format_reply(self, count, node):
+        """Format a (depth, status) pair indented under its parent"""
+        depth, status = node
+        prefix = '    ' * depth
+        lines = self.format(count, status).split('\n')
+        return '\n'.join([line and prefix + line for line in lines])
+
+    def render(self, statuses, format=None):
+        """Returns the number of statuses rendered"""
+        format = format or self.format
+        page = []
+        count = 0
+        try:
+            for status in statuses:
+                if len(page) == self.page_size:
+                    self.__write(page)
+                    page = []
+                    if self.pager and not self.__more():
+                        return count
+                count += 1
+                page.append(format(count, status))
+        finally:
+            # What was read before an error is still shown
+            if page:
+                self.__write(page)
+        return count
+
+    def render_tree(self, nodes):
+        """Render (depth, status) pairs as an indented tree"""
+        return self.render(nodes, self.format_reply)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""Rate limit aware scheduling of Core calls for turpial-cmd"""
+
+import time
+import threading
+
+from common import DEFAULT_LIMIT, DEFAULT_WINDOW, DEFAULT_MAX_WAIT
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Part of the quota that background requests can't use
+RESERVE = 0.2
+
+# Core methods scheduled and the endpoint whose quota they consume
+ENDPOINTS = {
+    'get_column_statuses': 'column',
+    'get_public_timeline': 'column',
+    'update_status': 'status',
+    'destroy_status': 'status',
+    'get_conversation': 'status',
+    'get_friends': 'friend',
+    'follow': 'friend',
+    'unfollow': 'friend',
+    'block': 'friend',
+    'unblock': 'friend',
+    'report_spam': 'friend',
+    'is_friend': 'friend',
+    'search': 'search',
+}
+
+class RateLimited(Exception):
+    """The request can't be done in the max wait time"""
+
+    def __init__(self, account, endpoint, wait):
+        Exception.__init__(self, account, endpoint, wait)
+        self.account = account
+        self.endpoint = endpoint
+        self.wait = wait
+
+    def __str__(self):
+        return 'Rate limit of %s requests reached for %s, retry in %i seconds' % (
+            self.endpoint, self.account, self.wait + 1)
+
+class Quota(object):
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset = time.time() + window
+        self.last = 0
+
+    def refresh(self, now):
+        if now >= self.reset:
+            self.remaining = self.limit
+            self.reset = now + self.window
+
+class Scheduler(object):
+    """Track the remaining quota of each account and endpoint and space the
+    requests so the quota lasts until the window is reset.
+
+    Interactive requests are done right away while there is quota left and
+    wait for the reset (up to max_wait seconds) otherwise. Background
+    requests can't use the last RESERVE part of the quota, are spaced evenly
+    along the window and always give way to waiting interactive requests.
+    The priority is set per thread with set_priority
+    """
+
+    def __init__(self, limit=DEFAULT_LIMIT, window=DEFAULT_WINDOW,
+            max_wait=DEFAULT_MAX_WAIT):
+        self.limit = limit
+        self.window = window
+        self.max_wait = max_wait
+        self.quotas = {}
+        self.waiting = 0
+        self.condition = threading.Condition()
+        self.local = threading.local()
+
+    def __quota(self, account, endpoint):
+        key = (account, endpoint)
+        if key not in self.quotas:
+            self.quotas[key] = Quota(self.limit, self.window)
+        return self.quotas[key]
+
+    def __wait_time(self, quota, priority, now):
+        quota.refresh(now)
+        if priority == INTERACTIVE:
+            if quota.remaining > 0:
+                return 0
+            return quota.reset - now
+
+        reserve = int(quota.limit * RESERVE)
+        if quota.remaining <= reserve:
+            return quota.reset - now
+        if self.waiting > 0:
+            return 1
+        spacing = (quota.reset - now) / (quota.remaining - reserve)
+        return max(0, quota.last + spacing - now)
+
+    def set_priority(self, priority):
+        self.local.priority = priority
+
+    def get_priority(self):
+        return getattr(self.local, 'priority', INTERACTIVE)
+
+    def projected_wait(self, account, endpoint, priority=INTERACTIVE):
+        self.condition.acquire()
+        try:
+            return self.__wait_time(self.__quota(account, endpoint), priority,
+                time.time())
+        finally:
+            self.condition.release()
+
+    def spacing(self, account, endpoint):
+        """Seconds between background requests that make the quota (but
+        the reserve) last until the window is reset"""
+        self.condition.acquire()
+        try:
+            now = time.time()
+            quota = self.__quota(account, endpoint)
+            quota.refresh(now)
+            usable = quota.remaining - int(quota.limit * RESERVE)
+            if usable <= 0:
+                return quota.reset - now
+            return (quota.reset - now) / usable
+        finally:
+            self.condition.release()
+
+    def acquire(self, account, endpoint):
+        """Block until the request can be done. Raise RateLimited when an
+        interactive request would wait more than max_wait seconds"""
+        priority = self.get_priority()
+        self.condition.acquire()
+        try:
+            quota = self.__quota(account, endpoint)
+            if priority == INTERACTIVE:
+                self.waiting += 1
+            try:
+                while 1:
+                    now = time.time()
+                    wait = self.__wait_time(quota, priority, now)
+                    if wait <= 0:
+                        break
+                    if priority == INTERACTIVE and wait > self.max_wait:
+                        raise RateLimited(account, endpoint, wait)
+                    self.condition.wait(min(wait, 1))
+            finally:
+                if priority == INTERACTIVE:
+                    self.waiting -= 1
+            quota.remaining -= 1
+            quota.last = now
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def update(self, account, endpoint, rtn):
+        """Update the quota with the response of the request"""
+        errmsg = getattr(rtn, 'errmsg', None) or ''
+        if getattr(rtn, 'code', 0) > 0 and 'rate limit' in errmsg.lower():
+            self.condition.acquire()
+            try:
+                self.__quota(account, endpoint).remaining = 0
+            finally:
+                self.condition.release()
+
+    def status(self):
+        """Returns a list of (account, endpoint, remaining, limit, reset)"""
+        self.condition.acquire()
+        try:
+            now = time.time()
+            rtn = []
+            for (account, endpoint), quota in sorted(self.quotas.items()):
+                quota.refresh(now)
+                rtn.append((account, endpoint, quota.remaining, quota.limit,
+                    quota.reset))
+            return rtn
+        finally:
+            self.condition.release()
+
+class ScheduledCore(object):
+    """Proxy of Core that sends the calls of ENDPOINTS through a Scheduler.
+    The first argument of those calls must be the account"""
+
+    def __init__(self, core, scheduler):
+        self.core = core
+        self.scheduler = scheduler
+
+    def __getattr__(self, name):
+        attr = getattr(self.core, name)
+        if name not in ENDPOINTS:
+            return attr
+
+        endpoint = ENDPOINTS[name]
+        def call(account, *args, **kwargs):
+            self.scheduler.acquire(account, endpoint)
+            rtn = attr(account, *args, **kwargs)
+            self.scheduler.update(account, endpoint, rtn)
+            return rtn
+        return call
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""Local socket API of turpial-cmd
+
+A server started with --serve reads requests from a Unix domain socket,
+one JSON object per line:
+
+    {"command": "column timeline --account foo-twitter", "id": 1}
+
+and answers each one with another line:
+
+    {"id": 1, "ok": true, "command": "column timeline", "output": "..."}
+
+'id' is optional and sent back as is. A client can send any number of
+requests through the same connection and many clients can be connected
+at the same time
+"""
+
+import os
+import json
+import socket
+import SocketServer
+
+class ServerError(Exception):
+    pass
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    def __response(self, line):
+        try:
+            request = json.loads(line)
+            command = request['command']
+            if not isinstance(command, basestring):
+                raise TypeError()
+        except (ValueError, KeyError, TypeError):
+            return {'id': None, 'ok': False, 'command': None,
+                'output': 'Invalid request: %s\n' % line}
+        ok, name, output = self.server.execute(command)
+        return {'id': request.get('id'), 'ok': ok, 'command': name,
+            'output': output}
+
+    def handle(self):
+        while 1:
+            line = self.rfile.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            self.wfile.write(json.dumps(self.__response(line.strip())) + '\n')
+            self.wfile.flush()
+
+class CommandServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """Run each request with execute(command), which must return (ok,
+    command name, output), in its own thread. The socket is readable and
+    writable only by its owner"""
+    daemon_threads = True
+
+    def __init__(self, path, execute):
+        basedir = os.path.dirname(path)
+        if basedir and not os.path.isdir(basedir):
+            os.makedirs(basedir)
+        if os.path.exists(path):
+            if ping(path):
+                raise ServerError('There is a server running at %s' % path)
+            # Left by a server that didn't exit cleanly
+            os.remove(path)
+        self.path = path
+        self.execute = execute
+        mask = os.umask(0077)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, path, RequestHandler)
+        finally:
+            os.umask(mask)
+
+    def close(self):
+        self.server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def ping(path):
+    """True if a server is listening at path"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+class CommandClient(object):
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(path)
+        except socket.error, exc:
+            self.sock.close()
+            raise ServerError("Can't connect to the server at %s: %s" % (
+                path, exc))
+        self.rfile = self.sock.makefile('rb')
+        self.next_id = 1
+
+    def send(self, command):
+        """Returns the response of the server to the command"""
+        request = {'command': command, 'id': self.next_id}
+        self.next_id += 1
+        try:
+            self.sock.sendall(json.dumps(request) + '\n')
+            line = self.rfile.readline()
+        except socket.error, exc:
+            raise ServerError('Connection lost: %s' % exc)
+        if not line:
+            raise ServerError('The server closed the connection')
+        return json.loads(line)
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
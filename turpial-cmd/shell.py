@@ -0,0 +1,2601 @@
+# -*- coding: utf-8 -*-
+
+"""Commands of the Turpial shell, loaded by turpial-cmd.py once the options
+are parsed"""
+#
+# Author: Wil Alvarez (aka Satanas)
+# 26 Jun, 2011
+
+import os
+import cmd
+import sys
+import time
+import shlex
+import signal
+import getpass
+import logging
+import threading
+from StringIO import StringIO
+
+from workers import WorkerPool, check_response
+from cache import StatusCache, CachedStatus, id_key
+from index import StatusIndex
+from render import StatusRenderer
+from follow import FollowManager
+from accounts import AccountRegistry
+from metrics import Metrics, InstrumentedCore
+from scheduler import Scheduler, ScheduledCore, RateLimited, BACKGROUND
+from bulk import Checkpoint, Report, read_usernames
+from graph import FriendGraph, FRIEND
+from profiles import ProfileCache
+from jobs import JobManager, ThreadState, ThreadOutput, CancellableCore, DONE
+from completion import PrefixIndex
+from paginate import Paginator, PageError, accepts
+from pool import ConnectionPool, PooledCore
+from timeline import merge_timelines
+from conversation import StatusStore, ThreadBuilder, ThreadError
+from trends import TrendStore, format_trends
+from directs import DirectStore
+from common import lazy_import, SOCKET_NAME
+
+# libturpial, Core and its protocol plugins are heavy to import, so they are
+# loaded with lazy_import only when a command needs them, as the modules
+# that import json, gzip, inspect or urllib2 (export, server, keepalive)
+#from config import ConfigApp
+
+INTRO = [
+    'Welcome to Turpial (shell mode).', 
+    'Type "help" to get a list of available commands.',
+    'Type "help <command>" to get a detailed help about that command'
+]
+
+ARGUMENTS = {
+    'account': ['add', 'edit', 'delete', 'list', 'change', 'default'],
+    'status': ['update', 'reply', 'delete', 'conversation'],
+    'profile': ['me', 'user', 'users', 'update'],
+    'friend': ['list', 'follow', 'unfollow', 'block', 'unblock', 'spammer',
+        'check', 'diff'],
+    'direct': ['send', 'delete', 'list', 'thread'],
+    'favorite': ['mark', 'unmark'],
+    'trends': ['diff'],
+}
+
+# Core call of each friend argument that can be run in bulk
+FRIEND_CALLS = {
+    'follow': 'follow',
+    'unfollow': 'unfollow',
+    'block': 'block',
+    'unblock': 'unblock',
+    'spammer': 'report_spam',
+    'check': 'is_friend',
+}
+
+STATUSES_PER_VIEW = 20
+
+# Statuses added at once to the search index and the completion
+INDEX_BATCH = 100
+
+# Subcommands and known columns of the column command
+COLUMN_COMMANDS = ['list', 'public', 'refresh', 'follow', 'unfollow', 'all']
+COLUMN_ARGUMENTS = COLUMN_COMMANDS + ['timeline', 'replies', 'directs',
+    'favorites']
+
+# Parameter keys offered by the tab completion
+PARAMETERS = ['account', 'all', 'author', 'bio', 'checkpoint', 'count',
+    'export', 'format', 'from-file', 'from-friends', 'from-id', 'gzip', 'id',
+    'local',
+    'location', 'name', 'pages', 'password', 'pin', 'protocol', 'purge',
+    'query', 'refresh', 'remember', 'report', 'resume', 'since', 'text',
+    'to-id', 'truncate', 'until', 'until-id', 'url', 'username', 'yes']
+
+# Parameters that never take a value
+FLAGS = ['gzip', 'refresh', 'resume']
+
+# Parameters that answer a yes/no question, their value can only be one of
+# ANSWERS
+CONFIRMATIONS = ['all', 'purge', 'remember', 'truncate', 'yes']
+ANSWERS = ['y', 'yes', 'n', 'no']
+
+# Lines with these parameters are not saved in the history
+SECRET_PARAMETERS = ['--password', '--pin']
+
+HISTORY_SIZE = 1000
+
+# Commands that can't run in background
+FOREGROUND_COMMANDS = ['exit', 'EOF', 'jobs', 'fg', 'wait', 'kill']
+
+def set_process_name():
+    if not sys.platform.startswith('linux'):
+        return
+    try:
+        import ctypes
+        libc = ctypes.CDLL('libc.so.6')
+        libc.prctl(15, 'turpial-cmd', 0, 0)
+    except (ImportError, OSError):
+        pass
+
+class ParameterError(Exception):
+    pass
+
+class Turpial(cmd.Cmd, object):
+    # State of the command being executed, jobs keep their own copy
+    account = ThreadState('account')
+    params = ThreadState('params')
+    interactive = ThreadState('interactive')
+    lastcmd = ThreadState('lastcmd')
+    
+    def __init__(self, options, core=None):
+        self.local = threading.local()
+        cmd.Cmd.__init__(self)
+        
+        if options.debug or options.clean: 
+            logging.basicConfig(level=logging.DEBUG)
+        else:
+            logging.basicConfig(level=logging.INFO)
+        
+        self.log = logging.getLogger('Turpial:Cmd')
+        #self.config = None
+        self.prompt = 'turpial> '
+        self.intro = '\n'.join(INTRO)
+        self.__backend = core
+        self.__core = None
+        self.__accounts = None
+        self.__cache = None
+        self.__index = None
+        self.__graph = None
+        self.__profiles = None
+        self.__trends = None
+        self.__directs = None
+        #self.app_cfg = ConfigApp()
+        #self.version = self.app_cfg.read('App', 'version')
+        
+        self.options = options
+        self.account = None
+        self.workers = options.workers
+        self.timeout = options.timeout
+        self.retries = options.retries
+        self.params = {}
+        self.interactive = True
+        self.metrics = Metrics()
+        self.scheduler = Scheduler(options.rate_limit, options.rate_window,
+            options.max_wait)
+        self.renderer = StatusRenderer(page_size=options.page_size,
+            pager=options.pager)
+        self.follower = FollowManager(self.__poll_column, self.__notify_column,
+            lambda account: self.scheduler.spacing(account, 'column'))
+        self.output_lock = threading.Lock()
+        self.at_prompt = False
+        self.pending_output = []
+        self.jobs = JobManager(self.__notify_job)
+        self.output = None
+        self.usernames = PrefixIndex()
+        self.status_ids = PrefixIndex()
+        self.columns = PrefixIndex(COLUMN_ARGUMENTS)
+        self.history_file = None
+        self.http_pool = None
+        self.previous_opener = None
+        self.statuses = StatusStore(options.status_cache_size)
+    
+    @property
+    def core(self):
+        if self.__core is None:
+            backend = self.__backend
+            if backend is None:
+                self.log.debug('Loading Core')
+                backend = lazy_import('libturpial.api.core').Core()
+                self.__backend = backend
+                if self.options.http_pool_size > 0:
+                    backend = self.__pool_connections(backend)
+            log = None
+            if self.options.debug:
+                log = self.log
+            self.__core = CancellableCore(ScheduledCore(InstrumentedCore(
+                backend, self.metrics, log), self.scheduler), self.jobs)
+        return self.__core
+    
+    def __pool_connections(self, backend):
+        """Make the requests of Core reuse the connections of its account
+        instead of opening (and handshaking) a new one each time"""
+        self.http_pool = ConnectionPool(self.options.http_pool_size,
+            self.options.http_idle_timeout)
+        # The protocols of libturpial request everything through urllib2,
+        # whose opener is global: the previous one is restored on close
+        urllib2 = lazy_import('urllib2')
+        self.previous_opener = urllib2._opener
+        urllib2.install_opener(lazy_import('keepalive').build_opener(
+            self.http_pool))
+        return PooledCore(backend, self.http_pool)
+    
+    @property
+    def accounts(self):
+        if self.__accounts is None:
+            self.__accounts = AccountRegistry(self.core)
+        return self.__accounts
+    
+    @property
+    def datadir(self):
+        if self.options.datadir:
+            return self.options.datadir
+        return lazy_import('config').CMD_DIR
+    
+    @property
+    def cache(self):
+        if self.__cache is None:
+            self.__cache = StatusCache(os.path.join(self.datadir, 'cache.db'), 
+                self.options.cache_size, self.options.cache_age)
+        return self.__cache
+    
+    @property
+    def index(self):
+        if self.__index is None:
+            self.__index = StatusIndex(os.path.join(self.datadir, 'index.db'))
+        return self.__index
+    
+    @property
+    def graph(self):
+        if self.__graph is None:
+            self.__graph = FriendGraph(os.path.join(self.datadir, 'friends.db'),
+                self.options.friends_ttl)
+        return self.__graph
+    
+    @property
+    def trend_store(self):
+        if self.__trends is None:
+            self.__trends = TrendStore(os.path.join(self.datadir, 'trends.db'),
+                self.options.trends_ttl)
+        return self.__trends
+    
+    @property
+    def direct_store(self):
+        if self.__directs is None:
+            self.__directs = DirectStore(os.path.join(self.datadir, 
+                'directs.db'), self.options.directs_ttl)
+        return self.__directs
+    
+    @property
+    def profiles(self):
+        if self.__profiles is None:
+            filepath = None
+            if self.options.persist_profiles:
+                filepath = os.path.join(self.datadir, 'profiles.json')
+            self.__profiles = ProfileCache(self.options.profile_cache_size,
+                self.options.profile_ttl, filepath)
+        return self.__profiles
+    
+    def run(self):
+        options = self.options
+        if options.connect:
+            failed = self.run_client(self.__batch_lines() or sys.stdin)
+            sys.exit(failed > 0 and 1 or 0)
+        
+        set_process_name()
+        if options.serve:
+            self.serve(self.__batch_lines())
+            sys.exit(0)
+        
+        if options.command or options.batch:
+            self.renderer.pager = False
+            failed = self.run_batch(self.__batch_lines())
+            self.close()
+            if failed > 0:
+                sys.exit(1)
+            sys.exit(0)
+        
+        try:
+            self.cmdloop()
+        except KeyboardInterrupt:
+            self.do_exit()
+        except EOFError:
+            self.do_exit()
+    
+    def __batch_lines(self):
+        """Returns the commands given with -m or -b, or None"""
+        if self.options.command:
+            return [self.options.command]
+        if self.options.batch == '-':
+            return sys.stdin
+        if self.options.batch:
+            try:
+                return open(self.options.batch, 'r')
+            except IOError, exc:
+                print "Can't read batch file: %s" % exc
+                sys.exit(1)
+        return None
+    
+    def __socket_path(self):
+        return self.options.socket or os.path.join(self.datadir, SOCKET_NAME)
+    
+    def serve(self, lines=None):
+        """Execute the commands sent to the socket until the process is
+        interrupted or terminated. lines (e.g. a login) run before"""
+        self.interactive = False
+        self.renderer.pager = False
+        if lines and self.run_batch(lines) > 0:
+            self.close()
+            sys.exit(1)
+        
+        path = self.__socket_path()
+        api = lazy_import('server')
+        try:
+            server = api.CommandServer(path, self.__serve_command)
+        except (api.ServerError, EnvironmentError), exc:
+            print "Can't start the server: %s" % exc
+            self.close()
+            sys.exit(1)
+        self.__capture_threads()
+        # Terminating the server must save the caches as exit does
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.log.info('Listening on %s' % path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            self.close()
+    
+    def __serve_command(self, line):
+        """Run a command sent to the server in the thread of its request.
+        Returns (ok, command name, output)"""
+        command = self.parseline(line.rstrip().rstrip('&'))[0]
+        if not command:
+            return False, None, 'You must specify a command\n'
+        if line.rstrip().endswith('&'):
+            return False, command, "The server can't run jobs\n"
+        if command in FOREGROUND_COMMANDS:
+            return False, command, "Command '%s' can't run in the server\n" % (
+                command)
+        out = StringIO()
+        try:
+            rtn = self.__run_detached(line, out, self.account)
+        except Exception, exc:
+            self.log.debug('Error executing %s' % line)
+            out.write('Unexpected error: %s\n' % exc)
+            rtn = False
+        return rtn is not False, command, out.getvalue()
+    
+    def run_client(self, lines):
+        """Send each line to the server and print its output. Returns the
+        number of failed commands"""
+        api = lazy_import('server')
+        try:
+            client = api.CommandClient(self.__socket_path())
+        except api.ServerError, exc:
+            print exc
+            return 1
+        count = 0
+        failed = 0
+        try:
+            for line in lines:
+                line = line.strip()
+                if line == '' or line.startswith('#'):
+                    continue
+                count += 1
+                start = time.time()
+                try:
+                    response = client.send(line)
+                except api.ServerError, exc:
+                    print exc
+                    failed += 1
+                    break
+                elapsed = time.time() - start
+                
+                sys.stdout.write(response['output'])
+                sys.stdout.flush()
+                if not response['ok']:
+                    failed += 1
+                    sys.stderr.write('[FAILED] %i: %s (%.3fs)\n' % (count,
+                        response['command'], elapsed))
+                else:
+                    sys.stderr.write('[OK] %i: %s (%.3fs)\n' % (count,
+                        response['command'], elapsed))
+        finally:
+            client.close()
+        sys.stderr.write('%i commands executed, %i failed\n' % (count, failed))
+        return failed
+    
+    def __takes_value(self, key, value):
+        if value.startswith('--') or key in FLAGS:
+            return False
+        if key in CONFIRMATIONS:
+            return value.lower() in ANSWERS
+        return True
+    
+    def __extract_params(self, line):
+        """Split the '--key value' parameters from the positional words of
+        a command line. A key without value is taken as a flag"""
+        try:
+            tokens = shlex.split(line)
+        except ValueError:
+            # An unquoted apostrophe, e.g. --text I'm
+            tokens = line.split()
+
+        words = []
+        params = {}
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token.startswith('--') and len(token) > 2:
+                key = token[2:]
+                if (i + 1 < len(tokens) and 
+                        self.__takes_value(key, tokens[i + 1])):
+                    params[key] = tokens[i + 1]
+                    i += 1
+                else:
+                    params[key] = True
+            else:
+                words.append(token)
+            i += 1
+        return ' '.join(words), params
+
+    def __ask(self, key, message, blank=False, secret=False):
+        """Return the value of parameter --key if it was given in the command
+        line, otherwise ask for it (only in interactive mode)"""
+        if key in self.params:
+            value = self.params[key]
+            if value is True:
+                raise ParameterError('Parameter --%s needs a value' % key)
+            if value == '' and not blank:
+                raise ParameterError("Parameter --%s can't be blank" % key)
+            return value
+
+        if not self.interactive:
+            if blank:
+                return ''
+            raise ParameterError('Missing parameter --%s' % key)
+
+        if secret:
+            return getpass.unix_getpass(message)
+        return raw_input(message)
+
+    def __count(self):
+        value = self.params.get('count', STATUSES_PER_VIEW)
+        try:
+            return int(value)
+        except ValueError:
+            raise ParameterError('Parameter --count must be a number')
+    
+    def __date(self, key):
+        value = self.params.get(key)
+        if value is None:
+            return None
+        try:
+            return time.mktime(time.strptime(str(value), '%Y-%m-%d'))
+        except ValueError:
+            raise ParameterError('Parameter --%s must be a date (YYYY-MM-DD)' % key)
+    
+    def __resolve_account(self, value):
+        accounts = self.accounts.list()
+        if value in accounts:
+            return value
+        matches = [acc for acc in accounts 
+            if self.accounts.username(acc) == value]
+        if len(matches) == 1:
+            return matches[0]
+        if self.__validate_index(value, accounts):
+            return accounts[int(value)]
+        raise ParameterError("Invalid account '%s'" % value)
+
+    def __validate_index(self, index, array, blank=False):
+        try:
+            a = array[int(index)]
+            return True
+        except IndexError:
+            return False
+        except ValueError:
+            if blank and index == '':
+                return True
+            elif not blank and index == '':
+                return False
+            elif blank and index != '':
+                return False
+        except TypeError:
+            if index is None:
+                return False
+    
+    def __validate_accounts(self):
+        if len(self.accounts.list()) > 0:
+            return True
+        print "You don't have any registered account. Run 'account add' command"
+        return False
+    
+    def __validate_default_account(self):
+        if self.account:
+            return True
+        print "You don't have a default account. Run 'account change' command"
+        return False
+        
+    def __validate_arguments(self, arg_array, value):
+        if value in arg_array:
+            return True
+        else:
+            print 'Invalid Argument'
+            return False
+    
+    def __build_message_menu(self):
+        text = self.__ask('text', 'Message: ', blank=True)
+        if text == '':
+            print 'You must write something to post'
+            return None
+
+        if len(text) > 140:
+            if self.__build_confirm_menu('Your message has more than 140 characters. Do you want truncate it?', 'truncate', True):
+                return text[:140]
+            return None
+        return text
+
+    def __build_accounts_menu(self, _all=False):
+        if 'account' in self.params:
+            return self.__resolve_account(self.params['account'])
+
+        if len(self.accounts.list()) == 1:
+            return self.accounts.list()[0]
+
+        if not self.interactive:
+            raise ParameterError('Missing parameter --account')
+
+        index = None
+        while 1:
+            accounts = self.__show_accounts()
+            if _all:
+                index = raw_input('Select account (or Enter for all): ')
+            else:
+                index = raw_input('Select account: ')
+            if not self.__validate_index(index, accounts, _all):
+                print "Invalid account"
+            else:
+                break
+        if index == '':
+            return ''
+        else:
+            return accounts[int(index)]
+    
+    def __build_password_menu(self, account):
+        passwd = None
+        while 1:
+            passwd = self.__ask('password', "Password for '%s' in '%s': " % (
+                self.accounts.username(account), 
+                self.accounts.protocol(account)), secret=True)
+            if passwd:
+                return passwd
+            else:
+                print "Password can't be blank"
+            
+    def __build_change_account_menu(self):
+        if len(self.accounts.list()) == 1:
+            if self.account:
+                print "Your unique account is already your default"
+            else:
+                self.__add_first_account_as_default()
+        elif 'account' in self.params:
+            self.account = self.__resolve_account(self.params['account'])
+            print "Set %s in %s as your new default account" % (
+                self.accounts.username(self.account), 
+                self.accounts.protocol(self.account))
+        elif len(self.accounts.list()) > 1:
+            if not self.interactive:
+                raise ParameterError('Missing parameter --account')
+            while 1:
+                accounts = self.__show_accounts()
+                index = raw_input('Select you new default account (or Enter for keep current): ')
+                if index == '':
+                    print "Default account remain with no changes"
+                    return True
+                if not self.__validate_index(index, accounts):
+                    print "Invalid account"
+                else:
+                    break
+            self.account = accounts[int(index)]
+            print "Set %s in %s as your new default account" % (
+                self.accounts.username(self.account), 
+                self.accounts.protocol(self.account))
+        
+    def __build_protocols_menu(self):
+        index = None
+        protocols = self.core.list_protocols()
+        if 'protocol' in self.params:
+            if self.params['protocol'] in protocols:
+                return self.params['protocol']
+            raise ParameterError("Invalid protocol '%s'" % self.params['protocol'])
+        if not self.interactive:
+            raise ParameterError('Missing parameter --protocol')
+        while 1:
+            print "Available protocols:"
+            for i in range(len(protocols)):
+                print "[%i] %s" % (i, protocols[i])
+            index = raw_input('Select protocol: ')
+            if not self.__validate_index(index, protocols):
+                print "Invalid protocol"
+            else:
+                break
+        return protocols[int(index)]
+    
+    def __build_confirm_menu(self, message, key, default=False):
+        if self.params.get(key) is True:
+            return True
+        options = default and ' [Y/n]: ' or ' [y/N]: '
+        confirm = self.__ask(key, message + options, blank=True).lower()
+        if confirm == '':
+            return default
+        return confirm in ['y', 'yes']
+
+    def __user_input(self, key, message, blank=False):
+        while 1:
+            text = self.__ask(key, message, blank)
+            if text == '' and not blank:
+                print "You can't leave this field blank"
+                continue
+            break
+        return text
+        
+    def __add_first_account_as_default(self):
+        self.account = self.accounts.list()[0]
+        print "Selected account %s in %s as default (*)" % (
+            self.accounts.username(self.account), 
+            self.accounts.protocol(self.account))
+    
+    def __show_accounts(self):
+        if len(self.accounts.list()) == 0:
+            print "There are no registered accounts"
+            return
+        
+        accounts = []
+        print "Available accounts:"
+        for acc in self.accounts.list():
+            ch = ''
+            if acc == self.account:
+                ch = ' (*)'
+            print "[%i] %s%s" % (len(accounts), self.accounts.name(acc), ch)
+            accounts.append(acc)
+        return accounts
+        
+    def __show_profiles(self, people):
+        if not people:
+            print "There are no profiles to show"
+            return
+        
+        self.usernames.update([p.username for p in people])
+        for p in people:
+            protected = '<protected>' if p.protected else ''
+            following = '<following>' if p.following else ''
+            
+            header = "@%s (%s) %s %s" % (p.username, p.fullname, 
+                following, protected)
+            print header
+            print '-' * len(header)
+            print "URL: %s" % p.url
+            print "Location: %s" % p.location
+            print "Bio: %s" % p.bio
+            if p.last_update: 
+                print "Last: %s" % p.last_update
+            print ''
+    
+    def __show_statuses(self, statuses):
+        if statuses is None:
+            print "There are no statuses to show"
+            return
+        
+        if getattr(statuses, 'code', 0) > 0:
+            print statuses.errmsg
+            return False
+        
+        if 'export' in self.params:
+            return self.__export_statuses(statuses)
+        
+        renderer = self.renderer
+        if not self.interactive:
+            # Jobs can't ask for the next page
+            renderer = StatusRenderer(page_size=renderer.page_size)
+        count = renderer.render(self.__seen(statuses))
+        if count == 0:
+            print "There are no statuses to show"
+    
+    def __seen(self, statuses):
+        """Yield the statuses adding them to the search index and the
+        completion in batches, so long streams use constant memory"""
+        shown = []
+        usernames = []
+        ids = []
+        seen = []
+        def flush():
+            self.index.add(self.account, shown)
+            self.__remember(self.account, seen)
+            self.usernames.update(usernames)
+            self.status_ids.update(ids)
+            del shown[:], usernames[:], ids[:], seen[:]
+        
+        try:
+            for status in statuses:
+                # Statuses from the cache were indexed when downloaded
+                if not isinstance(status, CachedStatus):
+                    shown.append(status)
+                seen.append(status)
+                usernames.append(status.username)
+                ids.append(status.id_)
+                if len(ids) >= INDEX_BATCH:
+                    flush()
+                yield status
+        finally:
+            flush()
+    
+    def __remember(self, account, statuses):
+        """Keep the statuses by id to rebuild conversations"""
+        networks = {}
+        for status in statuses:
+            acc = getattr(status, 'account_id', None) or account
+            if acc:
+                networks.setdefault(self.accounts.protocol(acc), []).append(status)
+        for network, values in networks.items():
+            self.statuses.add(network, values)
+    
+    def __show_thread(self, status_id):
+        """Show the conversation of the status as a tree, asking Core only
+        for the statuses that weren't seen before"""
+        builder = ThreadBuilder(self.statuses, 
+            self.accounts.protocol(self.account), 
+            lambda id_: self.core.get_conversation(self.account, id_))
+        try:
+            nodes = builder.tree(status_id)
+        except ThreadError, exc:
+            print exc
+            return False
+        self.log.debug('Conversation of %s rebuilt with %i requests' % (
+            status_id, builder.fetched))
+        if not nodes:
+            print "There are no statuses to show"
+            return False
+        
+        statuses = [status for depth, status in nodes]
+        self.usernames.update([status.username for status in statuses])
+        self.status_ids.update([status.id_ for status in statuses])
+        if 'export' in self.params:
+            return self.__export_statuses(statuses)
+        renderer = self.renderer
+        if not self.interactive:
+            renderer = StatusRenderer(page_size=renderer.page_size)
+        renderer.render_tree(nodes)
+    
+    def __paginate(self, name, endpoint, *args):
+        """Returns a Paginator over the Core method name or None when no
+        pagination parameter was given"""
+        if not [key for key in ['pages', 'until', 'until-id'] 
+                if key in self.params]:
+            return None
+        # Without --pages the walk ends at --until or --until-id
+        pages = None
+        if 'pages' in self.params:
+            try:
+                pages = int(self.params['pages'])
+            except ValueError:
+                raise ParameterError('Parameter --pages must be a number')
+        until_id = self.params.get('until-id')
+        if until_id is True:
+            raise ParameterError('Parameter --until-id needs a value')
+        
+        account = self.account
+        method = getattr(self.core, name)
+        backend = getattr(self.__backend, name)
+        with_count = accepts(backend, 'count')
+        def fetch(max_id, count):
+            kwargs = {}
+            if with_count:
+                kwargs['count'] = count
+            if max_id is not None:
+                kwargs['max_id'] = max_id
+            return method(account, *args, **kwargs)
+        
+        return Paginator(self.jobs.bind(fetch), self.__count(), pages, 
+            self.__date('until'),
+            until_id, accepts(backend, 'max_id'), 
+            self.options.prefetch, 
+            lambda: self.scheduler.projected_wait(account, endpoint) <= 0)
+    
+    def __export_statuses(self, statuses):
+        filepath = self.params['export']
+        if filepath is True:
+            raise ParameterError('Parameter --export needs a value')
+        export = lazy_import('export')
+        format = self.params.get('format')
+        if format is not None and format not in export.FORMATS:
+            raise ParameterError('Parameter --format must be one of: %s' % 
+                ', '.join(export.FORMATS))
+        compress = None
+        if self.params.get('gzip') is True:
+            compress = True
+        
+        try:
+            exporter = export.StatusExporter(filepath, format, compress, 
+                'resume' in self.params)
+        except (IOError, ValueError, KeyError), exc:
+            print "Can't export to %s: %s" % (filepath, exc)
+            return False
+        
+        try:
+            try:
+                for status in self.__seen(statuses):
+                    exporter.write(status, self.account)
+            except IOError, exc:
+                print "Can't export to %s: %s" % (filepath, exc)
+                return False
+        finally:
+            exporter.close()
+        
+        print "%i statuses exported to %s" % (exporter.written, filepath)
+        if exporter.skipped:
+            print "%i statuses were already exported" % exporter.skipped
+    
+    def __prepare_login(self, acc):
+        if not self.core.has_stored_passwd(acc):
+            passwd = self.__build_password_menu(acc)
+            username = self.accounts.username(acc)
+            protocol = self.accounts.protocol(acc)
+            self.core.register_account(username, protocol, passwd)
+    
+    def __authorize_login(self, acc, rtn):
+        auth_obj = rtn.items
+        if auth_obj.must_auth():
+            print "Please visit %s, authorize Turpial and type the pin returned" % auth_obj.url
+            pin = self.__user_input('pin', 'Pin for %s: ' % self.accounts.username(acc))
+            self.core.authorize_oauth_token(acc, pin)
+    
+    def __process_login(self, acc):
+        self.__prepare_login(acc)
+        
+        rtn = self.core.login(acc)
+        if rtn.code > 0:
+            print rtn.errmsg
+            return False
+
+        self.__authorize_login(acc, rtn)
+
+        rtn = self.core.auth(acc)
+        if rtn.code > 0:
+            print rtn.errmsg
+            return False
+        else:
+            print 'Logged in with account %s' % self.accounts.username(acc)
+    
+    def __process_parallel_login(self, accounts):
+        # Passwords and pins are requested in order before and between the
+        # concurrent steps, so prompts never get mixed between threads
+        for acc in accounts:
+            self.__prepare_login(acc)
+        
+        pool = WorkerPool(self.workers)
+        report = {}
+        pending = []
+        for task in self.__map(pool, self.core.login, accounts):
+            report[task.item] = [task.elapsed, None]
+            if task.failed():
+                report[task.item][1] = str(task.error)
+            elif task.result.code > 0:
+                report[task.item][1] = task.result.errmsg
+            else:
+                self.__authorize_login(task.item, task.result)
+                pending.append(task.item)
+        
+        for task in self.__map(pool, self.core.auth, pending):
+            report[task.item][0] += task.elapsed
+            if task.failed():
+                report[task.item][1] = str(task.error)
+            elif task.result.code > 0:
+                report[task.item][1] = task.result.errmsg
+        
+        print "Login report:"
+        failed = False
+        for acc in accounts:
+            elapsed, error = report[acc]
+            if error:
+                failed = True
+                result = 'failed: %s' % error
+            else:
+                result = 'logged in'
+            print "  %s: %s (%.2fs)" % (self.accounts.name(acc), result, 
+                elapsed)
+        if failed:
+            return False
+
+    def __statuses_since(self, account, column, since_id):
+        """Returns the response of get_column_statuses with the statuses
+        newer than since_id. Backends without since_id send the whole
+        column, which is trimmed to the new statuses"""
+        core = self.core
+        if not since_id:
+            return core.get_column_statuses(account, column)
+        if accepts(self.__backend.get_column_statuses, 'since_id'):
+            return core.get_column_statuses(account, column, 
+                since_id=since_id)
+        rtn = core.get_column_statuses(account, column)
+        if rtn.code == 0:
+            rtn.items = [status for status in rtn 
+                if id_key(status.id_) > id_key(since_id)]
+        return rtn
+    
+    def __update_column(self, account, column):
+        """Download the statuses newer than the cached ones and merge them
+        into the cache. Returns the libturpial response"""
+        rtn = self.__statuses_since(account, column, 
+            self.cache.last_id(account, column))
+        if rtn.code == 0:
+            added = self.cache.store(account, column, rtn)
+            self.index.add(account, rtn)
+            self.__remember(account, rtn)
+            self.log.debug('%i new statuses in %s for %s' % (added, column, 
+                account))
+        return rtn
+    
+    def __poll_column(self, account, column):
+        self.scheduler.set_priority(BACKGROUND)
+        try:
+            rtn = self.__update_column(account, column)
+        except RateLimited, exc:
+            return [], str(exc)
+        if rtn.code > 0:
+            return [], rtn.errmsg
+        statuses = list(rtn)
+        self.usernames.update([status.username for status in statuses])
+        self.status_ids.update([status.id_ for status in statuses])
+        return statuses, None
+    
+    def __notify_column(self, follower, statuses, error):
+        out = StringIO()
+        out.write('[%s/%s] ' % (self.accounts.username(follower.account), 
+            follower.column))
+        if error:
+            out.write('%s\n' % error)
+        else:
+            out.write('%i new statuses\n' % len(statuses))
+            StatusRenderer(out, len(statuses)).render(statuses)
+        self.__print_async(out.getvalue())
+    
+    def __print_async(self, text, defer=False, out=None):
+        """Print text from a background thread without breaking the line
+        the user is typing. With defer, text is kept until the running
+        command finishes. 'out' is the output of the thread the text
+        belongs to (sys.stdout by default)"""
+        out = out or sys.stdout
+        self.output_lock.acquire()
+        try:
+            if defer and not self.at_prompt:
+                self.pending_output.append(text)
+            elif self.at_prompt:
+                import readline
+                out.write('\r\x1b[K%s%s%s' % (text, self.prompt, 
+                    readline.get_line_buffer()))
+            else:
+                out.write(text)
+            out.flush()
+        finally:
+            self.output_lock.release()
+    
+    def __discard_output(self, text):
+        """Drop text from the output deferred until the running command
+        finishes"""
+        self.output_lock.acquire()
+        try:
+            if text in self.pending_output:
+                self.pending_output.remove(text)
+        finally:
+            self.output_lock.release()
+    
+    def __flush_output(self, at_prompt=False):
+        """Print the text deferred while the last command was running"""
+        self.output_lock.acquire()
+        try:
+            sys.stdout.write(''.join(self.pending_output))
+            sys.stdout.flush()
+            self.pending_output = []
+            self.at_prompt = at_prompt
+        finally:
+            self.output_lock.release()
+    
+    def __start_job(self, line):
+        command = self.parseline(line)[0]
+        if not command:
+            print 'You must specify a command to run in background'
+            return False
+        if command in FOREGROUND_COMMANDS:
+            print "Command '%s' can't run in background" % command
+            return False
+        
+        self.__capture_threads()
+        account = self.account
+        job = self.jobs.start(line, 
+            lambda job: self.__run_detached(job.line, job.output, account))
+        print "[%i] %s" % (job.id_, line)
+    
+    def __capture_threads(self):
+        """Replace sys.stdout so each thread can have its own output"""
+        if self.output is None:
+            self.output = ThreadOutput(sys.stdout)
+            sys.stdout = self.output
+            readline = sys.modules.get('readline')
+            if readline:
+                readline.set_startup_hook(self.__capture_output)
+    
+    def __run_detached(self, line, out, account):
+        """Run the command in this thread with its own account, parameters
+        and output (for jobs and the server)"""
+        self.local.account = account
+        self.local.params = {}
+        self.local.interactive = False
+        self.local.lastcmd = ''
+        self.output.capture(out)
+        try:
+            return self.onecmd(line)
+        finally:
+            self.output.release()
+    
+    def __capture_output(self):
+        # raw_input only uses readline when sys.stdout is a real file, so
+        # the output of the jobs is captured again once the prompt is shown
+        if self.output is not None:
+            sys.stdout = self.output
+    
+    def __job_report(self, job):
+        return "[%i] %s (%.2fs) %s\n%s" % (job.id_, job.state, job.elapsed(),
+            job.line, job.output.getvalue())
+    
+    def __notify_job(self, job):
+        self.__print_async(self.__job_report(job), defer=True)
+    
+    def __wait_job(self, job):
+        """Wait for the job and print its output. Returns False if it
+        failed"""
+        try:
+            self.jobs.wait(job)
+        except KeyboardInterrupt:
+            print "\n[%i] keeps running in background" % job.id_
+            job.collected = False
+            return False
+        report = self.__job_report(job)
+        # A job that finished before being collected was notified too
+        self.__discard_output(report)
+        sys.stdout.write(report)
+        return job.state == DONE
+    
+    def __map(self, pool, func, items, done=None):
+        """Run the pool accounting its time as network time of the current
+        command"""
+        start = time.time()
+        tasks = pool.map(self.jobs.bind(func), items, done)
+        self.metrics.add_remote(time.time() - start)
+        return tasks
+    
+    def __dump_metrics(self):
+        if not self.options.metrics_file:
+            return
+        try:
+            self.metrics.dump(self.options.metrics_file, 
+                self.options.metrics_format)
+        except IOError, exc:
+            print "Can't write metrics file: %s" % exc
+    
+    def __fan_out(self, func, accounts, message):
+        """Run func(acc) for all accounts at the same time and print a summary.
+        func must return a libturpial Response"""
+        pool = WorkerPool(self.workers, self.timeout, self.retries, 
+            check=check_response)
+        tasks = self.__map(pool, func, accounts)
+        
+        failed = 0
+        for task in tasks:
+            acc = task.item
+            if task.failed():
+                failed += 1
+                print "Failed in account %s: %s (%.2fs, %i attempts)" % (
+                    self.accounts.name(acc), task.error, task.elapsed, 
+                    task.attempts)
+            else:
+                print "%s in account %s (%.2fs)" % (message, 
+                    self.accounts.name(acc), task.elapsed)
+        print "%i succeeded, %i failed" % (len(tasks) - failed, failed)
+        return tasks
+    
+    def run_batch(self, lines):
+        """Execute each line as a command without asking anything to the
+        user. Returns the number of failed commands"""
+        self.interactive = False
+        count = 0
+        failed = 0
+        for line in lines:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            count += 1
+            start = time.time()
+            try:
+                rtn = self.onecmd(line)
+            except Exception, exc:
+                self.log.debug('Error executing %s' % self.lastcmd)
+                print 'Unexpected error: %s' % exc
+                rtn = False
+            elapsed = time.time() - start
+
+            # Parameters are not reported to avoid leaking passwords
+            sys.stdout.flush()
+            if rtn is False:
+                failed += 1
+                sys.stderr.write('[FAILED] %i: %s (%.3fs)\n' % (count,
+                    self.lastcmd, elapsed))
+            else:
+                sys.stderr.write('[OK] %i: %s (%.3fs)\n' % (count,
+                    self.lastcmd, elapsed))
+            self.__flush_output()
+            if rtn is True:
+                break
+        for job in self.jobs.running():
+            if self.__wait_job(job) is False:
+                failed += 1
+        sys.stderr.write('%i commands executed, %i failed\n' % (count, failed))
+        return failed
+
+    def onecmd(self, line):
+        if line.rstrip().endswith('&'):
+            line = line.rstrip()[:-1].strip()
+            self.lastcmd = '%s &' % (self.parseline(line)[0] or '')
+            return self.__start_job(line)
+        
+        try:
+            line, self.params = self.__extract_params(line)
+        except ParameterError, exc:
+            print exc
+            return False
+
+        command = self.parseline(line)[0]
+        default_account = self.account
+        rtn = False
+        self.metrics.begin_command()
+        start = time.time()
+        try:
+            if 'account' in self.params and command not in ['account', 'login']:
+                self.account = self.__resolve_account(self.params['account'])
+            rtn = cmd.Cmd.onecmd(self, line)
+            return rtn
+        except (ParameterError, RateLimited, PageError), exc:
+            print exc
+            return False
+        finally:
+            if command:
+                name = command
+                if not hasattr(self, 'do_' + command):
+                    name = 'unknown'
+                self.metrics.end_command(name, time.time() - start, 
+                    rtn is False)
+            if self.account != default_account and command != 'account':
+                self.account = default_account
+            self.params = {}
+
+    def preloop(self):
+        self.at_prompt = True
+        self.__load_history()
+    
+    def precmd(self, line):
+        self.at_prompt = False
+        self.__capture_output()
+        if self.history_file and [key for key in SECRET_PARAMETERS 
+                if key in line]:
+            import readline
+            readline.remove_history_item(readline.get_current_history_length() - 1)
+        return line
+    
+    def postcmd(self, stop, line):
+        if self.output is not None:
+            sys.stdout = self.output.stream
+        self.__flush_output(not stop)
+        return stop
+    
+    def default(self, line):
+        print '\n'.join(['Command not found.', INTRO[1], INTRO[2]])
+        return False
+        
+    def emptyline(self):
+        pass
+    
+    def __load_history(self):
+        try:
+            import readline
+        except ImportError:
+            return
+        # Parameters, usernames and lists of them are completed as a whole
+        readline.set_completer_delims(' \t\n,')
+        readline.set_history_length(HISTORY_SIZE)
+        self.history_file = os.path.join(self.datadir, 'history')
+        if os.path.isfile(self.history_file):
+            try:
+                readline.read_history_file(self.history_file)
+            except IOError, exc:
+                self.log.debug("Can't read history: %s" % exc)
+    
+    def __save_history(self):
+        import readline
+        try:
+            if not os.path.isdir(self.datadir):
+                os.makedirs(self.datadir)
+            readline.write_history_file(self.history_file)
+        except (IOError, OSError), exc:
+            print "Can't save history: %s" % exc
+    
+    def completedefault(self, text, line, begidx, endidx):
+        """Complete subcommands, parameters, columns, usernames and status
+        ids with what the shell has already seen. It never asks the server"""
+        words = line[:begidx].split()
+        command = words[0]
+        previous = words[-1]
+        if text.startswith('--'):
+            return ['--' + key for key in PARAMETERS 
+                if key.startswith(text[2:])]
+        if text.startswith('@'):
+            return ['@' + name for name in self.usernames.complete(text[1:])]
+        if previous in ['--username', '--author']:
+            return self.usernames.complete(text)
+        if previous == '--id':
+            return self.status_ids.complete(text)
+        if previous in ['--account', '--from-friends']:
+            if self.__accounts is None:
+                return []
+            return [self.accounts.username(acc) for acc in self.accounts.list()
+                if self.accounts.username(acc).startswith(text)]
+        
+        if len(words) == 1:
+            if command == 'column':
+                return self.columns.complete(text)
+            return [arg for arg in ARGUMENTS.get(command, []) 
+                if arg.startswith(text)]
+        if command == 'column' and words[1] in ['refresh', 'follow', 'unfollow']:
+            return [column for column in self.columns.complete(text) 
+                if column not in COLUMN_COMMANDS]
+        if command == 'profile' and words[1] == 'users':
+            return self.usernames.complete(text)
+        return []
+    
+    def do_account(self, arg):
+        if not self.__validate_arguments(ARGUMENTS['account'], arg): 
+            self.help_account(False)
+            return False
+        
+        if arg == 'add':
+            username = self.__ask('username', 'Username: ')
+            password = self.__ask('password', 'Password: ', secret=True)
+            remember = self.__build_confirm_menu('Remember password', 'remember')
+            protocol = self.__build_protocols_menu()
+            acc_id = self.core.register_account(username, protocol, password, remember)
+            self.accounts.invalidate()
+            print 'Account added'
+            if len(self.accounts.list()) == 1: 
+                self.__add_first_account_as_default()
+        elif arg == 'edit':
+            if not self.__validate_default_account(): 
+                return False
+            password = self.__ask('password', 'New Password: ', secret=True)
+            username = self.accounts.username(self.account)
+            protocol = self.accounts.protocol(self.account)
+            remember = self.__build_confirm_menu('Remember password', 'remember')
+            self.core.register_account(username, protocol, password, remember)
+            self.accounts.invalidate()
+            print 'Account edited'
+        elif arg == 'delete':
+            if not self.__validate_accounts(): 
+                return False
+            account = self.__build_accounts_menu()
+            conf = self.__build_confirm_menu('Do you want to delete account %s?' %
+                account, 'yes')
+            if not conf:
+                print 'Command cancelled'
+                return False
+            del_all = self.__build_confirm_menu('Do you want to delete all data?', 'purge')
+            self.core.unregister_account(account, del_all)
+            self.accounts.invalidate()
+            if self.account == account:
+                self.account = None
+            print 'Account deleted'
+        elif arg == 'change':
+            if not self.__validate_accounts():
+                return False
+            self.__build_change_account_menu()
+        elif arg == 'list':
+            self.__show_accounts()
+        elif arg == 'default':
+            if not self.__validate_default_account():
+                return False
+            print "Your default account is %s in %s" % (
+                self.accounts.username(self.account), 
+                self.accounts.protocol(self.account))
+    
+    def help_account(self, desc=True):
+        text = 'Manage user accounts'
+        if not desc:
+            text = ''
+        print '\n'.join([text,
+            'Usage: account <arg>\n',
+            'Possible arguments are:',
+            '  add:\t\t Add a new user account',
+            '  edit:\t\t Edit an existing user account',
+            '  delete:\t Delete a user account',
+            '  list:\t\t Show all registered accounts',
+            '  default:\t Show default account',
+        ])
+    
+    def do_login(self, arg):
+        if not self.__validate_accounts(): 
+            return False
+        
+        _all = True
+        if len(self.accounts.list()) > 1:
+            _all = self.__build_confirm_menu('Do you want to login with all available accounts?', 'all')
+        
+        if _all:
+            accounts = [acc for acc in self.accounts.list() 
+                if not self.core.is_account_logged_in(acc)]
+            if not accounts:
+                print "Already logged in with all available accounts"
+            elif len(accounts) == 1:
+                return self.__process_login(accounts[0])
+            else:
+                return self.__process_parallel_login(accounts)
+        else:
+            acc = self.__build_accounts_menu()
+            return self.__process_login(acc)
+    
+    def help_login(self):
+        print 'Login with one or many accounts'
+    
+    def do_profile(self, arg):
+        usernames = None
+        if arg.startswith('users '):
+            arg, usernames = arg.split(' ', 1)
+        if not self.__validate_arguments(ARGUMENTS['profile'], arg): 
+            self.help_profile(False)
+            return False
+        
+        if not self.__validate_default_account(): 
+            return False
+        
+        if arg == 'me':
+            username = self.accounts.username(self.account)
+            profile = self.__cached_profile(username)
+            if profile is not None:
+                return self.__show_profiles([profile])
+            profiles = self.__store_profiles(
+                self.core.get_own_profile(self.account))
+            if profiles is None:
+                return False
+            return self.__show_profiles(profiles)
+        elif arg == 'user':
+            username = self.__ask('username', 'Type the username: ', blank=True)
+            if username == '':
+                print 'You must specify a username'
+                return False
+            profile = self.__cached_profile(username)
+            if profile is not None:
+                return self.__show_profiles([profile])
+            profiles = self.__store_profiles(
+                self.core.get_user_profile(self.account, username))
+            if profiles is None:
+                return False
+            return self.__show_profiles(profiles)
+        elif arg == 'users':
+            if usernames is None:
+                usernames = self.__ask('username', 
+                    'Type the usernames (separated by commas): ', blank=True)
+            usernames = usernames.replace(',', ' ').split()
+            if not usernames:
+                print 'You must specify at least one username'
+                return False
+            return self.__show_users(usernames)
+        elif arg == 'update':
+            args = {}
+            name = self.__ask('name', 'Type your name (ENTER for none): ', True)
+            bio = self.__ask('bio', 'Type your bio (ENTER for none): ', True)
+            url = self.__ask('url', 'Type your url (ENTER for none): ', True)
+            location = self.__ask('location', 'Type your location (ENTER for none): ', True)
+            
+            if name != '':
+                args['name'] = name
+            if bio != '':
+                args['description'] = bio
+            if url != '':
+                args['url'] = url
+            if location != '':
+                args['location'] = location
+            result = self.core.update_profile(self.account, args)
+            
+            if result.code > 0:
+                print result.errmsg
+                return False
+            else:
+                self.profiles.invalidate(self.account, 
+                    self.accounts.username(self.account))
+                print 'Profile updated'
+    
+    def help_profile(self, desc=True):
+        text = 'Manage user profile'
+        if not desc:
+            text = ''
+        print '\n'.join([text,
+            'Usage: profile <arg>\n',
+            'Possible arguments are:',
+            '  me:\t\t Show own profile',
+            '  user:\t\t Show profile for a specific user',
+            '  users:\t Show profiles of many users (profile users a,b,c)',
+            '  update:\t Update own profile\n',
+            'Profiles are cached for --profile-ttl seconds, use --refresh to',
+            'ask the server again',
+        ])
+    
+    def __cached_profile(self, username):
+        if 'refresh' in self.params:
+            return None
+        return self.profiles.get(self.account, username)
+    
+    def __store_profiles(self, rtn):
+        """Cache the profiles of a Core response. Returns them in a list or
+        None on error"""
+        if rtn is None:
+            print 'You must be logged in'
+            return None
+        if rtn.code > 0:
+            print rtn.errmsg
+            return None
+        profiles = list(rtn)
+        for profile in profiles:
+            self.profiles.put(self.account, profile)
+        return profiles
+    
+    def __show_users(self, usernames):
+        """Show the profiles of usernames asking the server only for the
+        ones that aren't cached"""
+        found = {}
+        missing = []
+        seen = set()
+        for username in usernames:
+            key = username.lstrip('@').lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            profile = self.__cached_profile(username)
+            if profile is None:
+                missing.append(username)
+            else:
+                found[key] = profile
+        self.log.debug('%i profiles cached, %i to fetch' % (len(found), 
+            len(missing)))
+        
+        # Core has no bulk lookup, the missing profiles are fetched at the
+        # same time instead
+        failed = 0
+        if missing:
+            account = self.account
+            def check(rtn):
+                if rtn is None:
+                    return 'You must be logged in'
+                return check_response(rtn)
+            pool = WorkerPool(self.workers, self.timeout, self.retries, 
+                check=check)
+            tasks = self.__map(pool, 
+                lambda username: self.core.get_user_profile(account, username),
+                missing)
+            for task in tasks:
+                if task.failed():
+                    failed += 1
+                    print "Can't get profile of %s: %s" % (task.item, task.error)
+                    continue
+                for profile in task.result:
+                    self.profiles.put(account, profile)
+                    found[task.item.lstrip('@').lower()] = profile
+        
+        profiles = []
+        for username in usernames:
+            profile = found.pop(username.lstrip('@').lower(), None)
+            if profile is not None:
+                profiles.append(profile)
+        self.__show_profiles(profiles)
+        if failed:
+            return False
+    
+    def do_status(self, arg):
+        if not self.__validate_default_account(): 
+            return False
+        
+        if not self.__validate_arguments(ARGUMENTS['status'], arg): 
+            self.help_status(False)
+            return False
+        
+        if arg == 'update':
+            message = self.__build_message_menu()
+            if not message:
+                print 'You must to write something'
+                return False
+            
+            broadcast = self.__build_confirm_menu('Do you want to post the message in all available accounts?', 'all')
+            if broadcast:
+                tasks = self.__fan_out(lambda acc: self.core.update_status(acc, message),
+                    self.accounts.list(), 'Message posted')
+                if [task for task in tasks if task.failed()]:
+                    return False
+            else:
+                rtn = self.core.update_status(self.account, message)
+                if rtn.code > 0:
+                    print rtn.errmsg
+                    return False
+                else:
+                    print 'Message posted in account %s' % (
+                        self.accounts.username(self.account))
+        elif arg == 'reply':
+            reply_id = self.__ask('id', 'Status ID: ', blank=True)
+            if reply_id == '':
+                print "You must specify a valid id"
+                return False
+            message = self.__build_message_menu()
+            if not message:
+                print 'You must to write something'
+                return False
+            rtn = self.core.update_status(self.account, message, reply_id)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            else:
+                # The reply shows up in the next conversation of reply_id
+                if getattr(rtn.items, 'id_', None):
+                    self.__remember(self.account, [rtn.items])
+                print 'Reply posted in account %s' % (
+                    self.accounts.username(self.account))
+        elif arg == 'delete':
+            status_id = self.__ask('id', 'Status ID: ', blank=True)
+            if status_id == '':
+                print "You must specify a valid id"
+                return False
+            rtn = self.core.destroy_status(self.account, status_id)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            else:
+                print 'Status deleted'
+        elif arg == 'conversation':
+            status_id = self.__ask('id', 'Status ID: ', blank=True)
+            if status_id == '':
+                print "You must specify a valid id"
+                return False
+            return self.__show_thread(status_id)
+    
+    def help_status(self, desc=True):
+        text = 'Manage statuses for each protocol'
+        if not desc:
+            text = ''
+        print '\n'.join([text,
+           'Usage: status <arg>\n',
+            'Possible arguments are:',
+            '  update:\t Update status ',
+            '  delete:\t Delete status',
+            '  conversation:\t Show the conversation of a status as a tree: the',
+            '\t\t statuses it replies to and the replies seen to them',
+        ])
+    
+    def do_column(self, arg):
+        if arg.split(' ')[0] == 'all':
+            return self.__show_all_columns(arg.split(' ')[1:])
+        
+        if not self.__validate_default_account(): 
+            return False
+        
+        lists = self.core.list_columns(self.account)
+        self.columns.update(lists)
+        if arg == '':
+            self.help_column(False)
+        elif arg == 'list':
+            if len(lists) == 0:
+                print "No column available. Maybe you need to login"
+                return False
+            print "Available columns:"
+            for li in lists:
+                print "  %s" % li
+        elif arg == 'public':
+            rtn = self.core.get_public_timeline(self.account)
+            return self.__show_statuses(rtn)
+        elif arg.split(' ')[0] == 'refresh':
+            if len(lists) == 0:
+                print "No column available. Maybe you need to login"
+                return False
+            columns = arg.split(' ')[1:] or lists
+            for column in columns:
+                if column not in lists:
+                    print "Invalid column '%s'" % column
+                    return False
+                self.cache.clear(self.account, column)
+                rtn = self.__update_column(self.account, column)
+                if rtn.code > 0:
+                    print rtn.errmsg
+                    return False
+                print "Column %s refreshed" % column
+        elif arg.split(' ')[0] == 'follow':
+            columns = arg.split(' ')[1:]
+            if not columns:
+                if not self.follower.active():
+                    print "You are not following any column"
+                for acc, column in self.follower.active():
+                    print "  %s: %s" % (self.accounts.name(acc), column)
+                return
+            
+            if self.params.get('all') is True:
+                accounts = self.accounts.list()
+            else:
+                accounts = [self.account]
+            for acc in accounts:
+                available = self.core.list_columns(acc)
+                for column in columns:
+                    if column not in available:
+                        print "Invalid column '%s' for %s" % (column, 
+                            self.accounts.username(acc))
+                    elif self.follower.follow(acc, column):
+                        print "Following %s of %s" % (column, self.accounts.username(acc))
+                    else:
+                        print "Already following %s of %s" % (column, 
+                            self.accounts.username(acc))
+        elif arg.split(' ')[0] == 'unfollow':
+            columns = arg.split(' ')[1:] or [None]
+            count = 0
+            for column in columns:
+                count += self.follower.unfollow(column=column)
+            print "Stopped following %i columns" % count
+        else:
+            if len(lists) == 0:
+                print "No column available. Maybe you need to login"
+                return False
+            if arg in lists:
+                pages = self.__paginate('get_column_statuses', 'column', arg)
+                if pages is not None:
+                    return self.__show_statuses(pages)
+                rtn = self.__update_column(self.account, arg)
+                if rtn.code > 0:
+                    print rtn.errmsg
+                    return False
+                count = self.__count()
+                if 'export' in self.params and 'count' not in self.params:
+                    count = None
+                statuses = self.cache.get(self.account, arg, count)
+                return self.__show_statuses(statuses)
+            else:
+                print "Invalid column '%s'" % arg
+                return False
+    
+    def __show_all_columns(self, args):
+        """Show the column of every logged in account merged by date"""
+        if len(args) != 1 or not args[0]:
+            print "You must specify one column. Example: column all timeline"
+            return False
+        column = args[0]
+        if not self.__validate_accounts():
+            return False
+        accounts = [acc for acc in self.accounts.list() 
+            if self.core.is_account_logged_in(acc)]
+        if not accounts:
+            print "You are not logged in with any account"
+            return False
+        
+        available = []
+        for acc in accounts:
+            lists = self.core.list_columns(acc)
+            self.columns.update(lists)
+            if column in lists:
+                available.append(acc)
+            else:
+                print "Invalid column '%s' for %s" % (column, 
+                    self.accounts.name(acc))
+        if not available:
+            return False
+        
+        pool = WorkerPool(self.workers, self.timeout, self.retries, 
+            check=check_response)
+        tasks = self.__map(pool, 
+            lambda acc: self.__update_column(acc, column), available)
+        for task in tasks:
+            if task.failed():
+                print "Failed in account %s: %s (showing cached statuses)" % (
+                    self.accounts.name(task.item), task.error)
+        
+        count = self.__count()
+        if 'export' in self.params and 'count' not in self.params:
+            count = None
+        # No account can give more than count statuses to the merge
+        timelines = [(acc, self.cache.get(acc, column, count)) 
+            for acc in available]
+        key = lambda acc, status: (self.accounts.protocol(acc), 
+            str(status.id_))
+        return self.__show_statuses(self.__tag(
+            merge_timelines(timelines, count, key)))
+    
+    def __tag(self, merged):
+        for acc, status in merged:
+            status.tag = self.accounts.username(acc)
+            yield status
+    
+    def help_column(self, desc=True):
+        text = 'Show user columns'
+        if not desc:
+            text = ''
+        print '\n'.join([text,
+           'Usage: column <arg>\n',
+            'Possible arguments are:',
+            '  list:\t\t List all available columns for that account',
+            '  timeline:\t Show timeline',
+            '  replies:\t Show replies',
+            '  directs:\t Show directs messages',
+            '  favorites:\t Show statuses marked as favorites',
+            '  public:\t Show public timeline',
+            '  refresh:\t Discard the cached statuses and download them again',
+            '\t\t (all columns or only the given ones)',
+            '  follow:\t Print new statuses of the given columns as they',
+            '\t\t arrive (use --all for every account). Without columns',
+            '\t\t list the followed ones',
+            '  unfollow:\t Stop following the given columns (or all of them)',
+            '  all:\t\t Show the given column of every logged in account',
+            '\t\t merged by date and tagged with the account',
+            '  <list_id>:\t Show statuses for the user list with id <list_id>\n',
+            'With --export <file> the statuses are saved to a file (see help',
+            'export). Without --pages, --until or --until-id only the cached',
+            'statuses are written, at most --cache-size of them',
+        ])
+        
+    def do_friend(self, arg):
+        if not self.__validate_default_account(): 
+            return False
+        
+        if not self.__validate_arguments(ARGUMENTS['friend'], arg): 
+            self.help_friend(False)
+            return False
+        
+        if arg in FRIEND_CALLS and ('from-file' in self.params or 
+                'from-friends' in self.params):
+            return self.__bulk_friend(arg)
+        
+        if arg == 'list':
+            if not self.__sync_friends():
+                return False
+            friends = self.graph.list(self.account)
+            if len(friends) == 0:
+                print "Hey! What's wrong with you? You've no friends"
+                return False
+            self.usernames.update([fn[0] for fn in friends])
+            print "Friends list:"
+            print '\n'.join(["+ @%s (%s)" % fn for fn in friends])
+        elif arg == 'diff':
+            return self.__friend_diff()
+        elif arg == 'follow':
+            username = self.__ask('username', 'Username: ', blank=True)
+            if username == '':
+                print "You must specify a valid user"
+                return False
+            rtn = self.core.follow(self.account, username)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            self.graph.set_friend(self.account, username, True)
+            print "Following %s" % username
+        elif arg == 'unfollow':
+            username = self.__ask('username', 'Username: ', blank=True)
+            if username == '':
+                print "You must specify a valid user"
+                return False
+            rtn = self.core.unfollow(self.account, username)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            self.graph.set_friend(self.account, username, False)
+            print "Not following %s" % username
+        elif arg == 'block':
+            username = self.__ask('username', 'Username: ', blank=True)
+            if username == '':
+                print "You must specify a valid user"
+                return False
+            rtn = self.core.block(self.account, username)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            print "Blocking user %s" % username
+        elif arg == 'unblock':
+            username = self.__ask('username', 'Username: ', blank=True)
+            if username == '':
+                print "You must specify a valid user"
+                return False
+            rtn = self.core.unblock(self.account, username)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            print "Unblocking user %s" % username
+        elif arg == 'spammer':
+            username = self.__ask('username', 'Username: ', blank=True)
+            if username == '':
+                print "You must specify a valid user"
+                return False
+            rtn = self.core.report_spam(self.account, username)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            print "Reporting user %s as spammer" % username
+        elif arg == 'check':
+            username = self.__ask('username', 'Username: ', blank=True)
+            if username == '':
+                print "You must specify a valid user"
+                return False
+            following = self.graph.is_follower(self.account, username)
+            if following is None or 'refresh' in self.params:
+                rtn = self.core.is_friend(self.account, username)
+                if rtn.code > 0:
+                    print rtn.errmsg
+                    return False
+                following = bool(rtn.items)
+                self.graph.set_follower(self.account, username, following)
+            if following:
+                print "%s is following you" % username
+            else:
+                print "%s is not following you" % username
+    
+    def help_friend(self, desc=True):
+        text = 'Manage user friends'
+        if not desc:
+            text = ''
+        print '\n'.join([text,
+           'Usage: friend <arg>\n',
+            'Possible arguments are:',
+            '  list:\t\t List all friends',
+            '  follow:\t Follow user',
+            '  unfollow:\t Unfollow friend',
+            '  block:\t Block user',
+            '  unblock:\t Unblock user',
+            '  spammer:\t Report user as spammer',
+            '  check:\t Verify if certain user is following you',
+            '  diff:\t\t Show friends and followers added or removed since',
+            '\t\t the last sync (or since --since YYYY-MM-DD)\n',
+            'list and check use the local copy of your friends and followers',
+            'until it is older than --friends-ttl seconds. Use --refresh to',
+            'ask the server again.\n',
+            'All the arguments but list can be run over many users with',
+            '--from-file <file> (one username per line, - for stdin) or',
+            '--from-friends <account> (the friends of another account).',
+            'Processed users are saved in a checkpoint (--checkpoint <file>)',
+            'so running the same command again resumes an interrupted run,',
+            'and the result of each user is written to a CSV (--report <file>)',
+        ])
+    
+    def __sync_friends(self):
+        """Download the friends of the account when the local copy is stale
+        or --refresh is given. Returns False on error"""
+        if self.graph.fresh(self.account) and 'refresh' not in self.params:
+            return True
+        friends = self.core.get_friends(self.account)
+        if friends.code > 0:
+            print friends.errmsg
+            return False
+        added, removed = self.graph.sync(self.account, 
+            [(fn.username, fn.fullname) for fn in friends])
+        self.log.debug('Friends of %s synced: %i added, %i removed' % (
+            self.account, len(added), len(removed)))
+        return True
+    
+    def __friend_diff(self):
+        since = self.__date('since')
+        if since is None and not self.__sync_friends():
+            return False
+        changes = self.graph.changes(self.account, since)
+        if not changes:
+            print "There are no changes in your friends since %s" % (
+                time.strftime('%b %d, %H:%M', time.localtime(since or
+                self.graph.last_sync(self.account))))
+            return
+        for kind, username, added, timestamp in changes:
+            if kind == FRIEND:
+                action = added and 'You followed' or 'You unfollowed'
+            else:
+                action = added and 'Followed by' or 'Unfollowed by'
+            print "%s  %s @%s" % (time.strftime('%b %d, %H:%M', 
+                time.localtime(timestamp)), action, username)
+    
+    def __bulk_usernames(self):
+        source = self.params.get('from-file')
+        friends = self.params.get('from-friends')
+        if source is True or friends is True:
+            raise ParameterError('Parameters --from-file and --from-friends '
+                'need a value')
+        
+        if friends:
+            rtn = self.core.get_friends(self.__resolve_account(friends))
+            if rtn.code > 0:
+                raise ParameterError("Can't get friends of %s: %s" % (friends,
+                    rtn.errmsg))
+            return [friend.username for friend in rtn]
+        if source == '-':
+            return read_usernames(sys.stdin)
+        try:
+            fd = open(source, 'r')
+        except IOError, exc:
+            raise ParameterError("Can't read %s: %s" % (source, exc))
+        try:
+            return read_usernames(fd)
+        finally:
+            fd.close()
+    
+    def __bulk_friend(self, arg):
+        """Run a friend argument over many users at the same time"""
+        usernames = self.__bulk_usernames()
+        name = '%s-%s' % (self.account, arg)
+        bulkdir = os.path.join(self.datadir, 'bulk')
+        try:
+            checkpoint = Checkpoint(self.params.get('checkpoint') or 
+                os.path.join(bulkdir, name + '.checkpoint'))
+        except (IOError, OSError), exc:
+            print "Can't open the checkpoint: %s" % exc
+            return False
+        pending = [username for username in usernames 
+            if username not in checkpoint]
+        if len(pending) < len(usernames):
+            print "Resuming: %i of %i users were already processed" % (
+                len(usernames) - len(pending), len(usernames))
+        if not pending:
+            checkpoint.close(remove=True)
+            print "There are no users to process"
+            return
+        
+        try:
+            report = Report(self.params.get('report') or os.path.join(
+                bulkdir, '%s-%s.csv' % (name, time.strftime('%Y%m%d-%H%M%S'))))
+        except (IOError, OSError), exc:
+            checkpoint.close()
+            print "Can't create the report: %s" % exc
+            return False
+        call = getattr(self.core, FRIEND_CALLS[arg])
+        account = self.account
+        limited = []
+        progress = [0]
+        # done() runs in the pool threads, which don't see the state and
+        # the output of this one
+        interactive = self.interactive
+        out = self.output and self.output.target() or sys.stdout
+        
+        # Once the rate limit is reached the remaining users are left
+        # pending for the next run
+        def execute(username):
+            if limited:
+                return None
+            try:
+                return call(account, username)
+            except RateLimited, exc:
+                limited.append(exc)
+                return None
+        
+        def check(rtn):
+            if rtn is None:
+                return None
+            return check_response(rtn)
+        
+        def done(task):
+            if task.failed():
+                result = 'failed'
+            elif task.result is None:
+                result = 'pending'
+            elif arg == 'check':
+                result = task.result.items and 'following' or 'not following'
+                self.graph.set_follower(account, task.item, task.result.items)
+            else:
+                result = 'ok'
+                if arg in ['follow', 'unfollow']:
+                    self.graph.set_friend(account, task.item, arg == 'follow')
+            if result not in ['failed', 'pending']:
+                checkpoint.add(task.item)
+            error = task.error
+            if error is not None and not isinstance(error, basestring):
+                error = str(error)
+            report.add(task.item, result, error, task.attempts, task.elapsed)
+            progress[0] += 1
+            if interactive and progress[0] % 50 == 0:
+                self.__print_async('%i of %i users processed\n' % (
+                    progress[0], len(pending)), out=out)
+        
+        pool = WorkerPool(self.workers, self.timeout, self.retries, 
+            check=check)
+        tasks = self.__map(pool, execute, pending, done)
+        report.close()
+        
+        failed = len([task for task in tasks if task.failed()])
+        waiting = len([task for task in tasks 
+            if not task.failed() and task.result is None])
+        print "%i succeeded, %i failed, %i pending" % (
+            len(tasks) - failed - waiting, failed, waiting)
+        print "Report saved in %s" % report.filepath
+        if limited:
+            print limited[0]
+        checkpoint.close(remove=not (failed or waiting))
+        if failed or waiting:
+            print "Run the same command again to resume"
+            return False
+    
+    def do_direct(self, arg):
+        if not self.__validate_default_account(): 
+            return False
+        
+        partner = None
+        if arg.startswith('thread '):
+            arg, partner = arg.split(' ', 1)
+        if not self.__validate_arguments(ARGUMENTS['direct'], arg): 
+            self.help_direct(False)
+            return False
+        
+        if arg == 'send':
+            username = self.__ask('username', 'Username: ', blank=True)
+            if username == '':
+                print "You must specify a valid user"
+                return False
+            message = self.__build_message_menu()
+            if not message:
+                print 'You must to write something'
+                return False
+            
+            rtn = self.core.send_direct(self.account, username, message)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            else:
+                if getattr(rtn.items, 'id_', None):
+                    self.direct_store.add(self.account, 
+                        self.accounts.username(self.account), [rtn.items], 
+                        username)
+                print 'Direct message sent'
+        elif arg == 'delete':
+            if [key for key in ['from-id', 'to-id', 'username'] 
+                    if key in self.params]:
+                return self.__delete_directs()
+            dm_id = self.__ask('id', 'Direct message ID: ', blank=True)
+            if dm_id == '':
+                print "You must specify a valid id"
+                return False
+            rtn = self.core.destroy_direct(self.account, dm_id)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            else:
+                self.direct_store.remove(self.account, [dm_id])
+                print 'Direct message deleted'
+        elif arg == 'list':
+            if not self.__sync_directs():
+                return False
+            partners = self.direct_store.partners(self.account)
+            if not partners:
+                print "There are no direct messages"
+                return
+            self.usernames.update([row[0] for row in partners])
+            lines = []
+            for partner, count, received, last, text in partners:
+                text = text.replace('\n', ' ')
+                if len(text) > 40:
+                    text = text[:37] + '...'
+                lines.append('@%-16s %4i messages (%i received)  %s  %s' % (
+                    partner or '?', count, received, time.strftime(
+                    '%b %d, %H:%M', time.localtime(last)), text))
+            print '\n'.join(lines)
+        elif arg == 'thread':
+            if partner is None:
+                partner = self.__ask('username', 'Username: ', blank=True)
+            if partner == '':
+                print "You must specify a valid user"
+                return False
+            if not self.__sync_directs():
+                return False
+            messages = self.direct_store.thread(self.account, partner)
+            if not messages:
+                print "There are no direct messages with %s" % partner
+                return
+            print '\n'.join(['%s  @%s: %s (id: %s)' % (message.datetime, 
+                message.username, message.text.replace('\n', ' '), 
+                message.id_) for message in messages])
+    
+    def __sync_directs(self):
+        """Download the direct messages newer than the stored ones when
+        they are stale or --refresh is given. With --pages (or --until,
+        --until-id) older pages are downloaded too. Returns False on error"""
+        pages = self.__paginate('get_column_statuses', 'column', 'directs')
+        if (pages is None and self.direct_store.fresh(self.account) and 
+                'refresh' not in self.params):
+            return True
+        if pages is None:
+            pages = self.__statuses_since(self.account, 'directs', 
+                self.direct_store.last_sync(self.account)[1])
+            if pages.code > 0:
+                print pages.errmsg
+                return False
+        added = self.direct_store.sync(self.account, 
+            self.accounts.username(self.account), pages)
+        self.log.debug('%i new direct messages for %s' % (added, self.account))
+        return True
+    
+    def __delete_directs(self):
+        """Delete the stored messages with --username and/or between
+        --from-id and --to-id, many at the same time"""
+        for key in ['from-id', 'to-id', 'username']:
+            if self.params.get(key) is True:
+                raise ParameterError('Parameter --%s needs a value' % key)
+        if not self.__sync_directs():
+            return False
+        account = self.account
+        ids = self.direct_store.ids(account, self.params.get('username'),
+            self.params.get('from-id'), self.params.get('to-id'))
+        if not ids:
+            print "There are no direct messages to delete"
+            return
+        if not self.__build_confirm_menu('Do you want to delete %i direct '
+                'messages?' % len(ids), 'yes'):
+            print 'Command cancelled'
+            return False
+        
+        pool = WorkerPool(self.workers, self.timeout, self.retries, 
+            check=check_response)
+        tasks = self.__map(pool, 
+            lambda id_: self.core.destroy_direct(account, id_), ids)
+        deleted = [task.item for task in tasks if not task.failed()]
+        self.direct_store.remove(account, deleted)
+        failed = [task for task in tasks if task.failed()]
+        for task in failed:
+            print "Can't delete %s: %s" % (task.item, task.error)
+        print "%i direct messages deleted, %i failed" % (len(deleted), 
+            len(failed))
+        if failed:
+            return False
+    
+    def help_direct(self, desc=True):
+        text = 'Manage user direct messages'
+        if not desc:
+            text = ''
+        print '\n'.join([text,
+           'Usage: direct <arg>\n',
+            'Possible arguments are:',
+            '  send:\t\t Send direct message',
+            '  delete:\t Destroy direct message. With --username and/or',
+            '\t\t --from-id and --to-id destroy all the stored messages',
+            '\t\t with that user and/or in that range of ids',
+            '  list:\t\t List the conversations with the users of the',
+            '\t\t stored messages',
+            '  thread:\t Show the messages with a user, e.g. direct thread foo\n',
+            'Messages are read from a local store, synced with the server when',
+            'it is older than --directs-ttl seconds or with --refresh. Use',
+            '--pages to download older messages too',
+        ])
+    
+    def do_favorite(self, arg):
+        if not self.__validate_default_account(): 
+            return False
+        
+        if not self.__validate_arguments(ARGUMENTS['favorite'], arg): 
+            self.help_status(False)
+            return False
+        
+        if arg == 'mark':
+            status_id = self.__ask('id', 'Status ID: ', blank=True)
+            if status_id == '':
+                print "You must specify a valid id"
+                return False
+            rtn = self.core.mark_favorite(self.account, status_id)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            else:
+                print 'Status marked as favorite'
+        elif arg == 'unmark':
+            status_id = self.__ask('id', 'Status ID: ', blank=True)
+            if status_id == '':
+                print "You must specify a valid id"
+                return False
+            rtn = self.core.unmark_favorite(self.account, status_id)
+            if rtn.code > 0:
+                print rtn.errmsg
+                return False
+            else:
+                print 'Status unmarked as favorite'
+    
+    def help_favorite(self, desc=True):
+        text = 'Manage favorite marks of statuses'
+        if not desc:
+            text = ''
+        print '\n'.join([text,
+           'Usage: direct <arg>\n',
+            'Possible arguments are:',
+            '  mark:\t\t Mark a status as favorite',
+            '  unmark:\t Remove favorite mark from a status',
+        ])
+    
+    def __search_local(self, arg):
+        query = ' '.join([word for word in [self.params['local'], arg] 
+            if word and word is not True])
+        if not query:
+            query = self.__ask('query', 'Type what you want to search for: ')
+        
+        account = None
+        if 'account' in self.params:
+            account = self.account
+        until = self.__date('until')
+        if until:
+            until += 86400
+        
+        start = time.time()
+        statuses = self.index.search(query, account, self.params.get('author'),
+            self.__date('since'), until, self.__count())
+        elapsed = time.time() - start
+        self.__show_statuses(statuses)
+        if statuses:
+            print "%i statuses found in %.1fms" % (len(statuses), elapsed * 1000)
+    
+    def do_search(self, arg=None):
+        if 'local' in self.params:
+            return self.__search_local(arg)
+        
+        if not self.__validate_default_account(): 
+            return False
+        
+        if arg: 
+            self.help_search()
+            return False
+        
+        query = self.__ask('query', 'Type what you want to search for: ')
+        pages = self.__paginate('search', 'search', query)
+        if pages is not None:
+            return self.__show_statuses(pages)
+        rtn = self.core.search(self.account, query)
+        return self.__show_statuses(rtn)
+    
+    def help_search(self):
+        print '\n'.join(['Search for a pattern',
+            'Usage: search [--local <query>]\n',
+            'With --local the query is answered without network from the',
+            'statuses already seen in this and previous sessions. It accepts',
+            'the following filters:',
+            '  --account:\t Only statuses of that account',
+            '  --author:\t Only statuses posted by that user',
+            '  --since:\t Only statuses posted since that day (YYYY-MM-DD)',
+            '  --until:\t Only statuses posted until that day (YYYY-MM-DD)',
+            '  --count:\t Max number of statuses to show\n',
+            'Without --local, see help pages to get more than one page',
+        ])
+    
+    def help_pages(self):
+        print '\n'.join([
+            'Columns and searches show one page of statuses by default. These',
+            'parameters walk back through older pages:\n',
+            '  --pages <n>:\t\t Number of pages (of --count statuses)',
+            '  --until <YYYY-MM-DD>:\t Stop at the statuses older than that day',
+            '  --until-id <id>:\t Stop at that status\n',
+            'Pages are shown (or exported) as they arrive while the next ones',
+            'are requested, as long as the rate limit allows it. Example:\n',
+            '  column timeline --pages 10 --export timeline.jsonl',
+        ])
+    
+    def help_server(self):
+        print '\n'.join([
+            'turpial-cmd --serve keeps Core, the logins and the caches loaded',
+            'and runs the commands sent to a Unix socket (--socket, by default',
+            '%s in the data directory). Commands given with -m or -b run' % 
+            SOCKET_NAME,
+            'before, e.g. to login:\n',
+            '  turpial-cmd --serve -m "login --all" &',
+            '  turpial-cmd --connect -m "column timeline --account 0"\n',
+            'Scripts can talk to the socket directly, sending one JSON object',
+            'per line and reading one per line:\n',
+            '  {"command": "trends --account 0", "id": 1}',
+            '  {"id": 1, "ok": true, "command": "trends", "output": "..."}\n',
+            'Commands run as with -b: every value must be given as a parameter',
+            "and jobs, exit and the job commands can't be used",
+        ])
+    
+    def do_trends(self, arg=None):
+        if not self.__validate_default_account(): 
+            return False
+        
+        if arg and not self.__validate_arguments(ARGUMENTS['trends'], arg): 
+            self.help_trends(False)
+            return False
+        
+        if not self.__update_trends():
+            return False
+        if arg == 'diff':
+            return self.__trends_diff()
+        print format_trends(self.trend_store.latest(self.account)[1])
+    
+    def __update_trends(self):
+        """Take a new snapshot of the trends when the last one is stale or
+        --refresh is given. Returns False on error"""
+        if self.trend_store.fresh(self.account) and 'refresh' not in self.params:
+            return True
+        trends = self.core.trends(self.account)
+        if trends.code > 0:
+            print trends.errmsg
+            return False
+        self.trend_store.save(self.account, trends)
+        return True
+    
+    def __trends_diff(self):
+        since = self.__date('since')
+        changes = self.trend_store.diff(self.account, since)
+        if not changes and since:
+            print "There are no snapshots of trends before %s" % \
+                self.params['since']
+            return
+        if not changes:
+            print "There is only one snapshot of trends. Try again in %i " \
+                "seconds or with --refresh" % self.trend_store.ttl
+            return
+        
+        lines = []
+        for region, old, new, rising, falling in changes:
+            lines.append('%s (%s -> %s)' % (region, time.strftime(
+                '%b %d, %H:%M', time.localtime(old)), time.strftime(
+                '%b %d, %H:%M', time.localtime(new))))
+            if not rising and not falling:
+                lines.append('  No changes')
+            if rising:
+                lines.append('  Rising:  %s' % ', '.join(['%s (%s)' % (name, 
+                    before and '%i -> %i' % (before, after) or 'new') 
+                    for name, before, after in rising]))
+            if falling:
+                lines.append('  Falling: %s' % ', '.join(['%s (%s)' % (name, 
+                    after and '%i -> %i' % (before, after) or 'gone') 
+                    for name, before, after in falling]))
+        print '\n'.join(lines)
+    
+    def help_trends(self, desc=True):
+        text = 'Show global and local trends'
+        if not desc:
+            text = ''
+        print '\n'.join([text,
+           'Usage: trends [diff]\n',
+            'Trends are downloaded again only when the last ones are older',
+            'than --trends-ttl seconds, or with --refresh. Each download is',
+            'kept as a snapshot',
+            '  diff:\t\t Show the topics rising and falling in each region since',
+            '\t\t the previous snapshot (or the last one before --since)',
+        ])
+    
+    def do_jobs(self, arg=None):
+        jobs = self.jobs.list()
+        if not jobs:
+            print "There are no jobs"
+            return
+        for job in jobs:
+            print "[%i] %-9s %8.2fs  %s" % (job.id_, job.state, job.elapsed(),
+                job.line)
+    
+    def help_jobs(self):
+        print '\n'.join(['List the jobs running or finished',
+            'Add & at the end of any command to run it in background, e.g.:\n',
+            '  search --query turpial &\n',
+            'The output of a job is shown between prompts when it finishes.',
+            'See also fg, wait and kill',
+        ])
+    
+    def __get_job(self, arg):
+        try:
+            job = self.jobs.get(arg and int(arg.lstrip('%')) or None)
+        except ValueError:
+            job = None
+        if job is None:
+            print "There is no such job"
+        return job
+    
+    def do_fg(self, arg=None):
+        job = self.__get_job(arg)
+        if job is None:
+            return False
+        return self.__wait_job(job)
+    
+    def help_fg(self):
+        print '\n'.join(['Wait for a job and show its output',
+            'Usage: fg [<job>]\n',
+            'Without arguments use the last job. Ctrl+C stops waiting and',
+            'leaves the job running',
+        ])
+    
+    def do_wait(self, arg=None):
+        if arg:
+            return self.do_fg(arg)
+        rtn = None
+        for job in self.jobs.running():
+            if self.__wait_job(job) is False:
+                rtn = False
+        return rtn
+    
+    def help_wait(self):
+        print '\n'.join(['Wait for jobs and show their output',
+            'Usage: wait [<job>]\n',
+            'Without arguments wait for all the running jobs',
+        ])
+    
+    def do_kill(self, arg=None):
+        if not arg:
+            print 'You must specify a job'
+            return False
+        job = self.__get_job(arg)
+        if job is None:
+            return False
+        if not self.jobs.cancel(job):
+            print "[%i] is not running" % job.id_
+            return False
+        print "[%i] Cancelled %s" % (job.id_, job.line)
+    
+    def help_kill(self):
+        print '\n'.join(['Cancel a running job',
+            'Usage: kill <job>\n',
+            'The job stops before its next request and its output is discarded',
+        ])
+    
+    def do_stats(self, arg=None):
+        data = self.metrics.to_dict()
+        if arg:
+            for key in ['commands', 'core']:
+                if arg in data[key]:
+                    return self.__show_histogram(arg, data[key][arg])
+            print "There are no metrics for '%s'" % arg
+            return False
+        
+        if not data['commands'] and not data['core']:
+            print "There are no metrics yet"
+            return
+        
+        print "%-22s %6s %6s %10s %10s %10s" % ('Command', 'calls', 'errors', 
+            'avg ms', 'network ms', 'render ms')
+        for name in sorted(data['commands'].keys()):
+            values = data['commands'][name]
+            count = values['count']
+            print "%-22s %6i %6i %10.1f %10.1f %10.1f" % (name, count, 
+                sum(values['errors'].values()), 
+                values['seconds'] * 1000 / count,
+                data['network'][name]['seconds'] * 1000 / count,
+                data['render'][name]['seconds'] * 1000 / count)
+        print
+        print "%-22s %6s %6s %10s %10s" % ('Core call', 'calls', 'errors', 
+            'avg ms', 'items')
+        for name in sorted(data['core'].keys()):
+            values = data['core'][name]
+            print "%-22s %6i %6i %10.1f %10i" % (name, values['count'], 
+                sum(values['errors'].values()), 
+                values['seconds'] * 1000 / values['count'], values['size'])
+        
+        limits = self.scheduler.status()
+        if limits:
+            print
+            print "%-22s %-8s %10s %10s" % ('Account', 'endpoint', 'remaining', 
+                'reset in')
+            for acc, endpoint, remaining, limit, reset in limits:
+                print "%-22s %-8s %10s %9is" % (self.accounts.name(acc), 
+                    endpoint, '%i/%i' % (remaining, limit), 
+                    reset - time.time())
+        
+        if self.http_pool and self.http_pool.opened:
+            print
+            print "HTTP connections: %i opened, %i reused" % (
+                self.http_pool.opened, self.http_pool.reused)
+    
+    def __show_histogram(self, name, values):
+        print "%s: %i calls, %.1f ms avg" % (name, values['count'], 
+            values['seconds'] * 1000 / max(1, values['count']))
+        buckets = values['buckets']
+        bounds = sorted([b for b in buckets.keys() if b != '+Inf'], key=int)
+        top = max(buckets.values()) or 1
+        for bound in bounds + ['+Inf']:
+            label = '<= %s ms' % bound
+            if bound == '+Inf':
+                label = '>  %s ms' % bounds[-1]
+            bar = '#' * int(round(40.0 * buckets[bound] / top))
+            print "%12s | %s %i" % (label, bar, buckets[bound])
+        if values['errors']:
+            print "Errors: %s" % ', '.join(['%s (%i)' % (code, count) 
+                for code, count in sorted(values['errors'].items())])
+    
+    def help_stats(self):
+        print '\n'.join(['Show latency metrics of commands and Core calls',
+            'Usage: stats [<command>|<core call>]\n',
+            'Without arguments show calls, errors and average time (split in',
+            'network and render) per command and per Core call, the rate limit',
+            'quota left per account and the HTTP connections opened and reused.',
+            'With the name of a command or Core call show its latency histogram',
+        ])
+    
+    def do_EOF(self, line):
+        return self.do_exit('')
+        
+    def do_exit(self, line=None):
+        print
+        self.close()
+        self.log.debug('Bye')
+        return True
+    
+    def close(self):
+        """Stop the background work and save the local data"""
+        self.follower.stop_all()
+        self.jobs.stop_all()
+        if self.__cache:
+            self.__cache.close()
+            self.__cache = None
+        if self.__index:
+            self.__index.close()
+            self.__index = None
+        if self.__graph:
+            self.__graph.close()
+            self.__graph = None
+        if self.__trends:
+            self.__trends.close()
+            self.__trends = None
+        if self.__directs:
+            self.__directs.close()
+            self.__directs = None
+        if self.__profiles:
+            try:
+                self.__profiles.save()
+            except IOError, exc:
+                print "Can't save profiles: %s" % exc
+            self.__profiles = None
+        if self.history_file:
+            self.__save_history()
+            self.history_file = None
+        if self.http_pool:
+            lazy_import('urllib2').install_opener(self.previous_opener)
+            self.http_pool.close()
+            self.http_pool = None
+        self.__dump_metrics()
+    
+    def help_help(self):
+        print 'Show help. Dah!'
+    
+    def help_parameters(self):
+        print '\n'.join([
+            'Every value requested by a command can be given in the same line',
+            'as --<key> <value>. A --<key> without value answers yes to the',
+            'matching question. Running with -m or -b every required value must',
+            'be given this way. Values with spaces or quotes must be quoted.',
+            'Example:\n',
+            '  status update --account foo --text "Hello world, I\'m here" --all\n',
+            '--gzip, --refresh and --resume never take a value. --all, --yes,',
+            '--purge, --remember and --truncate only take y or n.\n',
+            'Available keys:',
+            '  --account:\t Account to use (id, username or index)',
+            '  --text:\t Text of the message',
+            '  --id:\t\t Id of the status or direct message',
+            '  --from-id, --to-id:\t Range of ids for direct delete',
+            '  --username:\t Username to act on',
+            '  --query:\t Search query',
+            '  --since, --until:\t Dates (YYYY-MM-DD) for search --local, friend diff',
+            '\t\t and trends diff',
+            '  --refresh:\t Ask the server instead of using local data',
+            '  --pages, --until-id:\t Walk back through older pages (see help pages)',
+            '  --export, --format, --gzip, --resume:\t Save statuses to a file',
+            '\t\t (see help export)',
+            '  --from-file, --from-friends, --checkpoint, --report:\t Bulk friend',
+            '\t\t operations (see help friend)',
+            '  --count:\t Number of statuses to show in columns',
+            '  --password, --protocol, --pin, --remember:\t Account data',
+            '  --name, --bio, --url, --location:\t Profile data',
+            '  --all:\t Use all the accounts (login, status update)',
+            '  --truncate:\t Truncate messages longer than 140 characters',
+            '  --yes, --purge:\t Confirm account deletion (and its data)',
+        ])
+        
+    def help_export(self):
+        print '\n'.join([
+            'Statuses of column, search and status conversation can be saved',
+            'to a file instead of shown with:\n',
+            '  --export <file>:\t File to write',
+            '  --format <format>:\t jsonl (one JSON object per line) or csv.',
+            '\t\t\t By default guessed from the file extension',
+            '  --gzip:\t\t Compress the file (default if it ends with .gz)',
+            '  --resume:\t\t Append to the file only the statuses newer than',
+            '\t\t\t the last one exported\n',
+            'Exporting a column writes all its cached statuses unless --count',
+            'is given. The cache keeps at most --cache-size statuses of each',
+            'column, use --pages, --until or --until-id (see help pages) to',
+            'export older ones. Example:\n',
+            '  column timeline --export timeline.jsonl.gz --resume',
+            '  column timeline --export timeline.jsonl --until 2012-01-01',
+        ])
+    
+    def help_exit(self):
+        print 'Close the application'
+    
+    def help_EOF(self):
+        print 'Close the application'
+    
+    def show_shorten_url(self, text):
+        print "URL Cortada:", text
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""Merge of the columns of several accounts for turpial-cmd"""
+
+import heapq
+
+from cache import id_key
+
+def merge_timelines(timelines, count=None, key=None):
+    """Merge timelines, a list of (account, statuses) with the statuses
+    sorted newest first, into a single stream sorted newest first. Yields
+    (account, status) pairs up to 'count' (None for no limit).
+
+    A status seen by more than one account is given once, with the first
+    account that has it. key(account, status) identifies the statuses
+    (their id by default)
+    """
+    if key is None:
+        key = lambda account, status: status.id_
+
+    heap = []
+    def push(i, iterator):
+        for status in iterator:
+            timestamp = getattr(status, 'timestamp', None) or 0
+            # Newest first: timestamps and ids are negated through the key
+            heapq.heappush(heap, ((-timestamp, Newer(status.id_)), i,
+                status, iterator))
+            return
+
+    for i, (account, statuses) in enumerate(timelines):
+        push(i, iter(statuses))
+
+    seen = set()
+    yielded = 0
+    while heap and (count is None or yielded < count):
+        order, i, status, iterator = heapq.heappop(heap)
+        account = timelines[i][0]
+        push(i, iterator)
+        status_key = key(account, status)
+        if status_key in seen:
+            continue
+        seen.add(status_key)
+        yielded += 1
+        yield account, status
+
+class Newer(object):
+    """Sort key that puts the newest status ids first"""
+
+    def __init__(self, id_):
+        self.key = id_key(id_)
+
+    def __lt__(self, other):
+        return self.key > other.key
+
+    def __eq__(self, other):
+        return self.key == other.key
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""Snapshots of the trends seen by turpial-cmd"""
+
+import os
+import time
+import sqlite3
+import threading
+
+from common import DEFAULT_TRENDS_TTL
+
+# Snapshots kept per account and region
+MAX_SNAPSHOTS = 48
+
+class CachedTopic(object):
+    def __init__(self, name, promoted):
+        self.name = name
+        self.promoted = bool(promoted)
+
+class CachedTrend(object):
+    """Trend group restored from a snapshot with the same attributes as the
+    libturpial one"""
+
+    def __init__(self, title, items):
+        self.title = title
+        self.items = items
+
+def format_trends(trends):
+    """Returns the text of the trend groups, one line per group"""
+    lines = []
+    for trend in trends:
+        lines.append(trend.title)
+        lines.append('=' * len(trend.title))
+        lines.append(' '.join(['%s%s |' % (topic.name, topic.promoted and '*'
+            or '') for topic in trend.items]))
+    return '\n'.join(lines)
+
+class TrendStore(object):
+    """Keep the newest 'keep' snapshots of the trends of each account and
+    region (the title of each trend group) in a SQLite database. The newest
+    snapshot of an account is fresh for 'ttl' seconds
+    """
+
+    def __init__(self, filepath, ttl=DEFAULT_TRENDS_TTL, keep=MAX_SNAPSHOTS):
+        self.filepath = filepath
+        self.ttl = ttl
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.newest = {}
+
+        basedir = os.path.dirname(filepath)
+        if not os.path.isdir(basedir):
+            os.makedirs(basedir)
+
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS topics (
+            account TEXT, region TEXT, timestamp REAL, position INTEGER,
+            name TEXT, promoted INTEGER)''')
+        self.conn.execute('''CREATE INDEX IF NOT EXISTS topics_snapshot
+            ON topics (account, region, timestamp)''')
+        self.conn.commit()
+
+    def __snapshots(self, account, region):
+        """Returns the timestamps of the snapshots of the region, newest
+        first"""
+        rows = self.conn.execute('''SELECT DISTINCT timestamp FROM topics
+            WHERE account = ? AND region = ? ORDER BY timestamp DESC''',
+            (account, region)).fetchall()
+        return [row[0] for row in rows]
+
+    def __topics(self, account, region, timestamp):
+        return self.conn.execute('''SELECT name, promoted FROM topics WHERE
+            account = ? AND region = ? AND timestamp = ? ORDER BY position''',
+            (account, region, timestamp)).fetchall()
+
+    def __regions(self, account):
+        rows = self.conn.execute('''SELECT region, MAX(timestamp) FROM topics
+            WHERE account = ? GROUP BY region ORDER BY MIN(rowid)''',
+            (account, )).fetchall()
+        return rows
+
+    def latest(self, account):
+        """Returns the timestamp and the trend groups of the newest snapshot
+        of the account, or (None, []) without snapshots"""
+        self.lock.acquire()
+        try:
+            if account not in self.newest:
+                timestamp = None
+                trends = []
+                for region, last in self.__regions(account):
+                    timestamp = max(timestamp, last)
+                    trends.append(CachedTrend(region, [CachedTopic(*row)
+                        for row in self.__topics(account, region, last)]))
+                self.newest[account] = (timestamp, trends)
+            return self.newest[account]
+        finally:
+            self.lock.release()
+
+    def fresh(self, account):
+        timestamp = self.latest(account)[0]
+        return timestamp is not None and time.time() - timestamp < self.ttl
+
+    def save(self, account, trends):
+        """Store a snapshot of the trend groups. Returns them as
+        CachedTrend"""
+        now = time.time()
+        saved = []
+        self.lock.acquire()
+        try:
+            for trend in trends:
+                topics = [CachedTopic(topic.name, topic.promoted)
+                    for topic in trend.items]
+                self.conn.executemany('''INSERT INTO topics VALUES
+                    (?, ?, ?, ?, ?, ?)''', [(account, trend.title, now, i,
+                    topic.name, int(topic.promoted))
+                    for i, topic in enumerate(topics)])
+                self.conn.execute('''DELETE FROM topics WHERE account = ? AND
+                    region = ? AND timestamp NOT IN (SELECT DISTINCT timestamp
+                    FROM topics WHERE account = ? AND region = ? ORDER BY
+                    timestamp DESC LIMIT ?)''', (account, trend.title,
+                    account, trend.title, self.keep))
+                saved.append(CachedTrend(trend.title, topics))
+            self.conn.commit()
+            self.newest[account] = (now, saved)
+        finally:
+            self.lock.release()
+        return saved
+
+    def diff(self, account, since=None):
+        """Compare the newest snapshot of each region with the previous one
+        (or the newest taken before 'since', a Unix timestamp). Returns a
+        list of (region, old timestamp, new timestamp, rising, falling) with
+        rising and falling lists of (name, old position, new position).
+        Positions start at 1 and are None for topics that were not there
+        """
+        rtn = []
+        self.lock.acquire()
+        try:
+            for region, last in self.__regions(account):
+                older = [timestamp for timestamp in
+                    self.__snapshots(account, region)[1:]
+                    if since is None or timestamp <= since]
+                if not older:
+                    continue
+                old = dict([(row[0], i + 1) for i, row in
+                    enumerate(self.__topics(account, region, older[0]))])
+                new = dict([(row[0], i + 1) for i, row in
+                    enumerate(self.__topics(account, region, last))])
+                rising = [(name, old.get(name), position) for name, position
+                    in new.items() if position < old.get(name, position + 1)]
+                falling = [(name, position, new.get(name)) for name, position
+                    in old.items() if position < new.get(name, position + 1)]
+                rising.sort(key=lambda change: change[2])
+                falling.sort(key=lambda change: change[1])
+                rtn.append((region, older[0], last, rising, falling))
+        finally:
+            self.lock.release()
+        return rtn
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.conn.close()
+        finally:
+            self.lock.release()
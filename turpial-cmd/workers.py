@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""Bounded thread pool to run Core calls of turpial-cmd concurrently"""
+
+import time
+import threading
+from Queue import Queue, Empty
+
+from common import DEFAULT_WORKERS
+
+DEFAULT_BACKOFF = 1
+
+class TimeoutError(Exception):
+    pass
+
+class Task(object):
+    """Outcome of running a function over a single item of the pool"""
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.elapsed = 0.0
+        self.attempts = 0
+
+    def failed(self):
+        return self.error is not None
+
+class WorkerPool(object):
+    """Run a function over a list of items with at most 'size' threads.
+
+    Each call can be limited by a timeout and retried with an exponential
+    backoff. 'check' receives the value returned by the function and must
+    return an error message when the call must be considered failed (and
+    retried) or None otherwise. Calls that time out are not retried: they
+    may still finish (e.g. post a status) in their abandoned thread
+    """
+
+    def __init__(self, size=DEFAULT_WORKERS, timeout=None, retries=0,
+            backoff=DEFAULT_BACKOFF, check=None):
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.check = check
+
+    def __call(self, func, item):
+        if not self.timeout:
+            return func(item)
+
+        # A call that doesn't return in time is abandoned in its own daemon
+        # thread, there is no safe way to interrupt it
+        box = {}
+        def target():
+            try:
+                box['result'] = func(item)
+            except Exception, exc:
+                box['error'] = exc
+        th = threading.Thread(target=target)
+        th.setDaemon(True)
+        th.start()
+        th.join(self.timeout)
+        if th.isAlive():
+            raise TimeoutError('timed out after %ss' % self.timeout)
+        if 'error' in box:
+            raise box['error']
+        return box['result']
+
+    def __execute(self, func, task):
+        start = time.time()
+        while 1:
+            task.attempts += 1
+            task.error = None
+            try:
+                task.result = func(task.item)
+                if self.check:
+                    task.error = self.check(task.result)
+            except Exception, exc:
+                task.error = exc
+            if (task.error is None or task.attempts > self.retries or
+                    isinstance(task.error, TimeoutError)):
+                break
+            time.sleep(self.backoff * (2 ** (task.attempts - 1)))
+        task.elapsed = time.time() - start
+
+    def __run(self, func, queue, done):
+        while 1:
+            try:
+                task = queue.get_nowait()
+            except Empty:
+                return
+            self.__execute(lambda item: self.__call(func, item), task)
+            if done:
+                done(task)
+
+    def map(self, func, items, done=None):
+        """Returns a list of Task objects in the same order of items. When
+        given, done(task) is called from the worker thread as soon as each
+        task finishes"""
+        tasks = [Task(item) for item in items]
+        queue = Queue()
+        for task in tasks:
+            queue.put(task)
+
+        threads = []
+        for i in range(min(self.size, len(tasks))):
+            th = threading.Thread(target=self.__run, args=(func, queue, done))
+            th.setDaemon(True)
+            th.start()
+            threads.append(th)
+        for th in threads:
+            th.join()
+        return tasks
+
+def check_response(rtn):
+    """Check function for calls that return a libturpial Response"""
+    if rtn.code > 0:
+        return rtn.errmsg
+    return None